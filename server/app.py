@@ -1,12 +1,15 @@
+import time
+_import_started = time.perf_counter()
+
 from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
-import yt_dlp
 import os
 import uuid
 import json
-import time
 import threading
 from video_processor import VideoProcessor
+from metrics import REGISTRY, peak_rss_bytes
+from artifact_manager import ArtifactManager
 from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
@@ -15,19 +18,33 @@ CORS(app)
 # Store processing progress for each video
 processing_progress = {}
 
+# Processors of running jobs, so they can be cancelled
+active_jobs = {}
+
 DOWNLOAD_FOLDER = "downloads"
 CLIPS_FOLDER = "downloads/clips"
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
 os.makedirs(CLIPS_FOLDER, exist_ok=True)
 
+# Evicts old downloads/derived files when the disk or quota runs out
+artifacts = ArtifactManager(DOWNLOAD_FOLDER)
+
 ALLOWED_EXTENSIONS = {'mp4', 'mov', 'avi', 'mkv', 'webm'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+@app.before_request
+def start_artifact_sweeper():
+    # Started lazily so every (forked) worker runs its own low-priority sweeper
+    artifacts.start_sweeper()
+
+
 @app.route("/download", methods=["POST"])
 def download_video():
+    import yt_dlp  # Heavy import, only needed by this route
+    
     data = request.json
     url = data.get("url")
     quality = data.get("quality", "720p")  # Default to 720p
@@ -37,6 +54,7 @@ def download_video():
 
     file_id = str(uuid.uuid4())
     output = os.path.join(DOWNLOAD_FOLDER, file_id)
+    artifacts.ensure_free_space()
 
     # Map quality to yt-dlp format string
     quality_map = {
@@ -142,6 +160,7 @@ def serve_video(filename):
     try:
         print(f"Serving video file: {filename}")
         response = send_from_directory(DOWNLOAD_FOLDER, filename)
+        artifacts.touch(filename)
 
         if filename.endswith(".vtt"):
             response.headers["Content-Type"] = "text/vtt"
@@ -187,6 +206,7 @@ def upload_video():
         file_extension = filename.rsplit('.', 1)[1].lower()
         
         # Save uploaded file
+        artifacts.ensure_free_space()
         output_path = os.path.join(DOWNLOAD_FOLDER, f"{file_id}.{file_extension}")
         file.save(output_path)
         
@@ -211,11 +231,12 @@ def upload_video():
 @app.route("/process", methods=["POST"])
 def process_video():
     """Process video to generate clips with AI"""
+    received_at = time.perf_counter()
     data = request.json
     video_id = data.get("videoId")
     user_id = data.get("userId")  # Optional - for saving to database
     skip_subtitles = data.get("skipSubtitles", False)  # New option
-    quality = data.get("quality", "720p")  # Video quality
+    quality = data.get("quality")  # Output height for clips; None keeps the source resolution
     subtitle_language = data.get("subtitleLanguage")  # Optional language specification
     
     # Advanced options
@@ -229,6 +250,18 @@ def process_video():
         'clip_mode': data.get('clipMode', 'ai'),  # 'ai', 'divide', or 'range'
         'quality': quality,  # Video quality for output clips
         'subtitle_language': subtitle_language,  # Subtitle language
+        'use_proxy': data.get('useProxy'),  # True/False/'auto' - decode heavy sources once
+        'clip_thumbnails': data.get('clipThumbnails', True),  # Poster image per clip
+        'thumbnail_mode': data.get('thumbnailMode', 'fast'),  # 'fast' or 'best' frame
+        'sprite_sheet': data.get('spriteSheet', False),  # Scrubbing preview per clip
+        'word_timestamps': data.get('wordTimestamps', False),  # Word-level transcript timing
+        'snap_to_words': data.get('snapToWords', True),  # Align clip cuts to speech edges
+        'vad': data.get('vad'),  # Skip silence/music before transcription (default: VAD_ENABLED)
+        'whisper_model': data.get('whisperModel', 'auto'),  # tiny/base/small/... or 'auto'
+        'latency_budget': data.get('latencyBudget'),  # Seconds allowed for transcription
+        'transcription_backend': data.get('transcriptionBackend'),  # whisper/whisper-int8/faster-whisper
+        'media_index': data.get('mediaIndex'),  # Keyframe/scene-change index (default: MEDIA_INDEX)
+        'snap_to_keyframes': data.get('snapToKeyframes', True),  # Cheap, shot-aligned cuts
     }
     
     if not video_id:
@@ -245,6 +278,11 @@ def process_video():
     if not video_path:
         return jsonify({"error": "Video file not found"}), 404
     
+    # Jobs already running compete with this one for CPU
+    options['queue_depth'] = sum(
+        1 for job in processing_progress.values() if job.get('status') == 'processing'
+    )
+    
     # Initialize progress tracking
     processing_progress[video_id] = {
         'progress': 0,
@@ -255,16 +293,24 @@ def process_video():
     try:
         print(f"Processing video: {video_id}")
         
+        # Keep this job's files from being evicted while it runs
+        artifacts.pin(video_id)
+        artifacts.ensure_free_space()
+        
         # Initialize processor
         processor = VideoProcessor(video_path, DOWNLOAD_FOLDER)
+        processor.trace.queue_wait(time.perf_counter() - received_at)
+        active_jobs[video_id] = processor
         
         # Create a callback function to update progress
-        def progress_callback(progress, step):
+        def progress_callback(progress, step, partial_transcript=None):
             processing_progress[video_id] = {
                 'progress': progress,
                 'step': step,
                 'status': 'processing'
             }
+            if partial_transcript:
+                processing_progress[video_id]['partialTranscript'] = partial_transcript
         
         # Run full pipeline with options and progress callback
         results = processor.process_full_pipeline(
@@ -273,6 +319,16 @@ def process_video():
             progress_callback=progress_callback
         )
         
+        REGISTRY.inc('clipforge_jobs_total', help_text='Processing jobs by final status', status=results['status'])
+        
+        if results['status'] == 'cancelled':
+            processing_progress[video_id] = {
+                'progress': 0,
+                'step': 'Cancelled',
+                'status': 'cancelled'
+            }
+            return jsonify({"error": "Processing cancelled"}), 409
+        
         if results['status'] == 'failed':
             processing_progress[video_id] = {
                 'progress': 0,
@@ -299,6 +355,8 @@ def process_video():
             "status": results['status'],
             "videoInfo": results.get('video_info', {}),
             "detectedLanguage": results.get('detected_language', 'unknown'),
+            "transcription": results.get('transcription'),
+            "timings": results.get('timings'),
             "subtitleUrl": f"http://127.0.0.1:5001/video/{video_id}.vtt" if results.get('subtitle_path') else None,
             "thumbnailUrl": f"http://127.0.0.1:5001/video/{video_id}_thumb.jpg" if results.get('thumbnail_path') else None,
             "clips": []
@@ -307,6 +365,8 @@ def process_video():
         # Add clip information
         for clip in results.get('clips', []):
             clip_filename = os.path.basename(clip['file_path'])
+            clip_thumbnail = clip.get('thumbnail_path')
+            clip_sprite = clip.get('sprite')
             response['clips'].append({
                 "clipNumber": clip['clip_number'],
                 "title": clip['title'],
@@ -317,7 +377,14 @@ def process_video():
                 "viralScore": clip['viral_score'],
                 "reason": clip['reason'],
                 "clipUrl": f"http://127.0.0.1:5001/video/{clip_filename}",
-                "filePath": clip['file_path']
+                "filePath": clip['file_path'],
+                "thumbnailUrl": f"http://127.0.0.1:5001/video/{os.path.basename(clip_thumbnail)}" if clip_thumbnail else None,
+                "sprite": {
+                    "url": f"http://127.0.0.1:5001/video/{os.path.basename(clip_sprite['path'])}",
+                    "columns": clip_sprite['columns'],
+                    "rows": clip_sprite['rows'],
+                    "interval": clip_sprite['interval']
+                } if clip_sprite else None
             })
         
         print(f"✅ Processing completed: {len(response['clips'])} clips created")
@@ -337,6 +404,25 @@ def process_video():
             'status': 'failed'
         }
         return jsonify({"error": f"Processing failed: {str(e)}"}), 500
+    finally:
+        active_jobs.pop(video_id, None)
+        artifacts.unpin(video_id)
+
+
+@app.route("/cancel/<video_id>", methods=["POST"])
+def cancel_processing(video_id):
+    """Cancel a running job and kill its FFmpeg processes"""
+    processor = active_jobs.get(video_id)
+    if not processor:
+        return jsonify({"error": "No running job for this video"}), 404
+    
+    processor.cancel()
+    processing_progress[video_id] = {
+        **processing_progress.get(video_id, {}),
+        'step': 'Cancelling...',
+        'status': 'cancelling'
+    }
+    return jsonify({"success": True, "videoId": video_id, "status": "cancelling"})
 
 
 @app.route("/progress/<video_id>", methods=["GET"])
@@ -352,6 +438,17 @@ def get_progress(video_id):
         }), 404
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint"""
+    REGISTRY.set('clipforge_jobs_in_progress',
+                 sum(1 for job in processing_progress.values() if job.get('status') == 'processing'),
+                 help_text='Jobs currently being processed')
+    REGISTRY.set('clipforge_process_peak_rss_bytes', peak_rss_bytes(),
+                 help_text='Peak resident memory of this worker')
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route("/video-info/<video_id>", methods=["GET"])
 def get_video_info(video_id):
     """Get video information"""
@@ -379,5 +476,20 @@ def get_video_info(video_id):
         return jsonify({"error": str(e)}), 500
 
 
+def _startup_report():
+    """Print how long the app took to import and how much memory it holds"""
+    elapsed = time.perf_counter() - _import_started
+    REGISTRY.set('clipforge_startup_seconds', round(elapsed, 3), help_text='Time to import the Flask app')
+    try:
+        import resource
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+        print(f"Flask app loaded in {elapsed:.2f}s (peak RSS {rss_mb:.0f} MB)")
+    except ImportError:
+        print(f"Flask app loaded in {elapsed:.2f}s")
+
+
+_startup_report()
+
+
 if __name__ == "__main__":
     app.run(debug=True, port=5001)
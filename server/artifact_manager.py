@@ -0,0 +1,326 @@
+"""
+Disk-space-aware lifecycle of everything written to the downloads folder
+
+Every top-level entry is attributed to the job (video id) whose name it
+starts with and classified into an eviction tier:
+
+    0  stale temporaries (.part/.tmp left behind by crashed writes)
+    1  cheap derived caches: proxies, keyframe indexes, speech maps,
+       columnar transcript stores, clip subtitle slices, posters, sprites
+       (and their cache keys)
+    2  transcripts and subtitles (re-creatable, but only by re-running Whisper)
+    3  clips
+    4  source videos
+
+A sweep evicts least-recently-used entries, lowest tier first, until the
+folder fits ARTIFACT_QUOTA_GB and the disk has ARTIFACT_MIN_FREE_GB free.
+Without a quota the free-space floor only evicts tiers 0-2, since the space
+may be used outside this folder and clips or sources are user data.
+Jobs that are running are pinned and never evicted. Sizes are measured on
+every sweep; last access times and pins live in `.artifacts.json` so they
+survive restarts and are shared by all workers.
+
+    artifacts = ArtifactManager('downloads')
+    artifacts.start_sweeper()
+    with artifacts.pinned(video_id):
+        ...
+    artifacts.touch(filename)
+"""
+import os
+import re
+import json
+import time
+import shutil
+import subprocess
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+ARTIFACT_QUOTA_BYTES = int(float(os.getenv('ARTIFACT_QUOTA_GB', '0')) * 2**30)  # 0 = no quota
+ARTIFACT_MIN_FREE_BYTES = int(float(os.getenv('ARTIFACT_MIN_FREE_GB', '2')) * 2**30)
+ARTIFACT_SWEEP_SECONDS = int(os.getenv('ARTIFACT_SWEEP_SECONDS', '300'))
+STALE_TEMP_SECONDS = 3600  # Temporaries older than this belong to no live writer
+FLOOR_MAX_TIER = 2  # Without a quota, the free-space floor only evicts up to transcripts
+
+INDEX_FILENAME = '.artifacts.json'
+LOCK_FILENAME = '.artifacts.lock'
+
+# (tier, kind, pattern for the name after the owning video id), first match wins
+TIERS = [
+    (0, 'temporary', re.compile(r'.*\.(part|tmp)(\.\w+)?$')),
+    (1, 'proxy', re.compile(r'^_proxy_(\d+p|source)\.mp4$')),
+    (1, 'media_index', re.compile(r'.*_index\.npz$')),
+    (1, 'speech_map', re.compile(r'^_speech\.json$')),
+    (1, 'transcript_store', re.compile(r'^_transcript$')),
+    (1, 'preview', re.compile(r'.*_(thumb|sprite)\.(jpg|json)$')),
+    (1, 'clip_subtitles', re.compile(r'^_clip_\d+\.vtt$')),
+    (2, 'transcript', re.compile(r'^(\.\w+)?\.(vtt|srt)$|^_transcript\.json$')),
+    (3, 'clip', re.compile(r'^_clip_\d+\.mp4$')),
+    (4, 'source', re.compile(r'^\.(mp4|mov|avi|mkv|webm)$', re.IGNORECASE)),
+]
+OWNER_PATTERN = re.compile(r'^([^_.]+)(.*)$')
+
+
+def classify(name):
+    """Return (owner, tier, kind) for an entry name, or None if it isn't ours"""
+    match = OWNER_PATTERN.match(name)
+    if not match:
+        return None
+    owner, rest = match.groups()
+    for tier, kind, pattern in TIERS:
+        if pattern.match(rest):
+            return owner, tier, kind
+    return None
+
+
+def _entry_size(path):
+    """Bytes used by a file, or by everything under a directory"""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _lower_priority():
+    """Best-effort: run the calling thread at idle CPU and I/O priority (Linux)"""
+    tid = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, tid, 19)
+    except (AttributeError, OSError):
+        pass
+    try:
+        subprocess.run(['ionice', '-c', '3', '-p', str(tid)], capture_output=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        pass
+
+
+class ArtifactManager:
+    """Tracks, pins and evicts artifacts in one output folder"""
+
+    def __init__(self, root, quota_bytes=ARTIFACT_QUOTA_BYTES, min_free_bytes=ARTIFACT_MIN_FREE_BYTES,
+                 sweep_seconds=ARTIFACT_SWEEP_SECONDS):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.sweep_seconds = sweep_seconds
+        self.index_path = os.path.join(root, INDEX_FILENAME)
+        self.lock_path = os.path.join(root, LOCK_FILENAME)
+        # Accesses since the last flush; merged into the index on sweep
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._sweeper_pid = None
+        self._stop = threading.Event()
+
+    @contextmanager
+    def _index(self):
+        """Read-modify-write the shared index under an inter-process file lock"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.index_path, encoding='utf-8') as f:
+                        index = json.load(f)
+                except (OSError, ValueError):
+                    index = {}
+                index.setdefault('artifacts', {})
+                index.setdefault('pins', {})
+                yield index
+                temp_path = self.index_path + '.tmp'
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(index, f)
+                os.replace(temp_path, self.index_path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def touch(self, name):
+        """Record an access to one entry (cheap; persisted on the next sweep)"""
+        classified = classify(os.path.basename(name))
+        if classified:
+            with self._lock:
+                self._touched[os.path.basename(name)] = time.time()
+
+    def touch_owner(self, video_id):
+        """Record an access to every entry of a job"""
+        now = time.time()
+        with self._lock:
+            for name in os.listdir(self.root):
+                classified = classify(name)
+                if classified and classified[0] == video_id:
+                    self._touched[name] = now
+
+    def pin(self, video_id):
+        """Protect a job's artifacts from eviction while it runs"""
+        with self._index() as index:
+            pids = index['pins'].setdefault(video_id, {})
+            pids[str(os.getpid())] = pids.get(str(os.getpid()), 0) + 1
+
+    def unpin(self, video_id):
+        with self._index() as index:
+            pids = index['pins'].get(video_id, {})
+            count = pids.get(str(os.getpid()), 0) - 1
+            if count > 0:
+                pids[str(os.getpid())] = count
+            else:
+                pids.pop(str(os.getpid()), None)
+            if not pids:
+                index['pins'].pop(video_id, None)
+        self.touch_owner(video_id)
+
+    @contextmanager
+    def pinned(self, video_id):
+        self.pin(video_id)
+        try:
+            yield
+        finally:
+            self.unpin(video_id)
+
+    def _scan(self, index):
+        """Refresh sizes and access times of everything on disk"""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+
+        known = index['artifacts']
+        current = {}
+        for entry in os.scandir(self.root):
+            classified = classify(entry.name)
+            if not classified:
+                continue
+            owner, tier, kind = classified
+            try:
+                mtime = entry.stat().st_mtime
+                size = _entry_size(entry.path)
+            except OSError:  # Removed while scanning
+                continue
+            previous = known.get(entry.name, {})
+            current[entry.name] = {
+                'owner': owner,
+                'tier': tier,
+                'kind': kind,
+                'size': size,
+                'mtime': mtime,
+                'last_access': max(previous.get('last_access', 0), touched.get(entry.name, 0), mtime)
+            }
+        index['artifacts'] = current
+
+        # Forget pins held by processes that no longer exist
+        for video_id in list(index['pins']):
+            pids = {pid: n for pid, n in index['pins'][video_id].items() if _pid_alive(int(pid))}
+            if pids:
+                index['pins'][video_id] = pids
+            else:
+                del index['pins'][video_id]
+        return current
+
+    def bytes_to_free(self, artifacts):
+        """(quota shortfall, free-space shortfall) in bytes"""
+        over_quota = 0
+        if self.quota_bytes:
+            over_quota = sum(a['size'] for a in artifacts.values()) - self.quota_bytes
+        free = shutil.disk_usage(self.root).free
+        return max(over_quota, 0), max(self.min_free_bytes - free, 0)
+
+    def sweep(self):
+        """Remove stale temporaries, then evict LRU entries tier by tier until within limits"""
+        removed = []
+        with self._index() as index:
+            artifacts = self._scan(index)
+            now = time.time()
+
+            for name, info in list(artifacts.items()):
+                if info['tier'] == 0 and now - info['mtime'] > STALE_TEMP_SECONDS and \
+                        info['owner'] not in index['pins']:
+                    if self._remove(name):
+                        removed.append(name)
+                        del artifacts[name]
+
+            over_quota, below_floor = self.bytes_to_free(artifacts)
+            # Without a quota, low disk may be caused outside this folder:
+            # only give up re-creatable files for it, never clips or sources
+            floor_max_tier = max(tier for tier, _, _ in TIERS) if self.quota_bytes else FLOOR_MAX_TIER
+            candidates = sorted(
+                (info['tier'], info['last_access'], name)
+                for name, info in artifacts.items()
+                if info['tier'] > 0 and info['owner'] not in index['pins']
+            )
+            for tier, _, name in candidates:
+                if over_quota <= 0 and (below_floor <= 0 or tier > floor_max_tier):
+                    break
+                size = artifacts[name]['size']
+                if self._remove(name):
+                    removed.append(name)
+                    over_quota -= size
+                    below_floor -= size
+                    del artifacts[name]
+
+        if removed:
+            print(f"Artifact sweep: removed {len(removed)} entries")
+        if over_quota > 0:
+            print(f"⚠️ Artifact sweep: still {over_quota / 2**20:.0f} MB over quota (remaining entries are pinned)")
+        if below_floor > 0:
+            print(f"⚠️ Artifact sweep: disk still {below_floor / 2**20:.0f} MB below the free-space floor "
+                  f"(clips and sources are only evicted for a quota)")
+        return removed
+
+    def ensure_free_space(self):
+        """Sweep right away if the disk is already below the free-space floor"""
+        if shutil.disk_usage(self.root).free < self.min_free_bytes:
+            self.sweep()
+
+    def _remove(self, name):
+        path = os.path.join(self.root, name)
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            return True
+        except FileNotFoundError:
+            return True
+        except OSError as e:
+            print(f"Artifact sweep: could not remove {name}: {e}")
+            return False
+
+    def start_sweeper(self):
+        """Start the background sweeper once per process (safe to call repeatedly, also after fork)"""
+        with self._lock:
+            if self._sweeper_pid == os.getpid() and self._sweeper.is_alive():
+                return
+            self._sweeper_pid = os.getpid()
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='artifact-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def _sweep_loop(self):
+        _lower_priority()
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Artifact sweep error: {e}")
+            self._stop.wait(self.sweep_seconds)
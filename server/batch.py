@@ -0,0 +1,213 @@
+"""
+Batch processing of many videos with one shared transcription model
+
+Usage:
+    python batch.py <directory>            # every video in the directory
+    python batch.py <manifest.jsonl>       # one JSON object per line
+    python batch.py archive/ --output-dir processed --jobs 4 --whisper-model base
+
+Manifest lines look like:
+    {"path": "talks/keynote.mp4", "options": {"num_clips": 3}, "skip_subtitles": false}
+
+Each video gets its own folder under --output-dir, named after its stem plus
+a short hash of its full path (so `a/talk.mp4` and `b/talk.mp4` don't
+collide), with the usual pipeline outputs plus `<stem>_results.json`. Videos whose results file already says
+"completed" are skipped, so an interrupted backfill can simply be re-run.
+Every finished item is appended to `<output-dir>/batch_results.jsonl`.
+
+Several videos are processed at once so FFmpeg work overlaps with
+transcription; the model is loaded once and transcription runs one job at a
+time on it, while CPU threads are split between the two so the machine is
+busy but not oversubscribed.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import transcription
+import video_processor
+from video_processor import VideoProcessor, warm_up
+
+VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv', '.webm'}
+
+
+def load_items(source, defaults):
+    """Build work items from a directory or a JSONL manifest"""
+    items = []
+    if os.path.isdir(source):
+        for path in sorted(Path(source).iterdir()):
+            if path.suffix.lower() in VIDEO_EXTENSIONS:
+                items.append({'path': str(path), 'options': dict(defaults['options']),
+                              'skip_subtitles': defaults['skip_subtitles']})
+    else:
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if 'path' not in entry:
+                    raise ValueError(f"{source}:{line_number}: missing 'path'")
+                path = entry['path']
+                if not os.path.isabs(path):
+                    path = os.path.join(base_dir, path)
+                items.append({
+                    'path': path,
+                    'options': {**defaults['options'], **entry.get('options', {})},
+                    'skip_subtitles': entry.get('skip_subtitles', defaults['skip_subtitles'])
+                })
+
+    seen = set()
+    for item in items:
+        item['path'] = os.path.abspath(item['path'])
+        if item['path'] in seen:
+            raise ValueError(f"{source}: {item['path']} is listed more than once")
+        seen.add(item['path'])
+    return items
+
+
+def item_dir(item, output_dir):
+    """Output folder of one video, unique per source path"""
+    digest = hashlib.sha1(item['path'].encode('utf-8')).hexdigest()[:8]
+    return os.path.join(output_dir, f"{Path(item['path']).stem}-{digest}")
+
+
+def results_path(item, output_dir):
+    return os.path.join(item_dir(item, output_dir), f"{Path(item['path']).stem}_results.json")
+
+
+def is_completed(item, output_dir):
+    """Whether a previous run already finished this video"""
+    path = results_path(item, output_dir)
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get('status') == 'completed'
+    except (OSError, ValueError):
+        return False
+
+
+def process_item(item, output_dir):
+    """Run the full pipeline for one video and save its results"""
+    output_path = item_dir(item, output_dir)
+    os.makedirs(output_path, exist_ok=True)
+
+    processor = VideoProcessor(item['path'], output_path)
+    results = processor.process_full_pipeline(
+        skip_subtitles=item['skip_subtitles'],
+        options=item['options']
+    )
+    # The full transcript is already on disk next to the results
+    results.pop('transcript', None)
+
+    output_json = results_path(item, output_dir)
+    with open(output_json + '.part', 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    os.replace(output_json + '.part', output_json)
+    return results
+
+
+def split_cpu_budget(cpus, jobs):
+    """Divide cores between the (single) transcription and the parallel encodes"""
+    transcribe_threads = max(1, cpus // 2)
+    ffmpeg_threads = max(1, (cpus - transcribe_threads) // max(1, jobs - 1)) if jobs > 1 else cpus
+    return transcribe_threads, ffmpeg_threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Process a directory or JSONL manifest of videos')
+    parser.add_argument('source', help='Directory of videos or JSONL manifest')
+    parser.add_argument('--output-dir', default='batch_output', help='Where outputs are written')
+    parser.add_argument('--jobs', type=int, default=max(2, (os.cpu_count() or 2) // 4),
+                        help='Videos processed at the same time')
+    parser.add_argument('--cpus', type=int, default=os.cpu_count() or 2, help='Total CPU budget')
+    parser.add_argument('--whisper-model', default='base',
+                        help="Whisper size shared by every video ('auto' requires --latency-budget)")
+    parser.add_argument('--latency-budget', type=float, default=None,
+                        help="Seconds of transcription allowed per video when --whisper-model is 'auto'")
+    parser.add_argument('--backend', default=None, help='Transcription backend (default: TRANSCRIBE_BACKEND)')
+    parser.add_argument('--clip-mode', default='ai', choices=['ai', 'divide', 'range'])
+    parser.add_argument('--num-clips', type=int, default=5)
+    parser.add_argument('--clip-duration', type=int, default=45)
+    parser.add_argument('--skip-subtitles', action='store_true')
+    parser.add_argument('--force', action='store_true', help='Reprocess videos that already completed')
+    args = parser.parse_args()
+    # 'auto' follows the interactive latency budget and would load several sizes
+    if args.whisper_model == 'auto' and args.latency_budget is None:
+        parser.error("--whisper-model auto needs an explicit --latency-budget")
+
+    defaults = {
+        'skip_subtitles': args.skip_subtitles,
+        'options': {
+            'clip_mode': args.clip_mode,
+            'num_clips': args.num_clips,
+            'clip_duration': args.clip_duration,
+            'whisper_model': args.whisper_model,
+            'latency_budget': args.latency_budget,
+            'transcription_backend': args.backend
+        }
+    }
+
+    items = load_items(args.source, defaults)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    pending = [item for item in items if args.force or not is_completed(item, args.output_dir)]
+    skipped = len(items) - len(pending)
+    print(f"Found {len(items)} videos: {skipped} already completed, {len(pending)} to process")
+    if not pending:
+        return
+
+    # Global CPU budget shared by the model and the concurrent encodes
+    transcribe_threads, ffmpeg_threads = split_cpu_budget(args.cpus, args.jobs)
+    transcription.CPU_THREADS = transcribe_threads
+    video_processor.FFMPEG_THREADS = ffmpeg_threads
+    print(f"Running {args.jobs} jobs: {transcribe_threads} transcription threads, "
+          f"{ffmpeg_threads} threads per FFmpeg encode")
+
+    if args.whisper_model != 'auto':
+        warm_up([args.whisper_model], args.backend)
+
+    summary_path = os.path.join(args.output_dir, 'batch_results.jsonl')
+    counts = {'completed': 0, 'failed': 0}
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(process_item, item, args.output_dir): item for item in pending}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                results = future.result()
+                record = {
+                    'path': item['path'],
+                    'status': results['status'],
+                    'clips': len(results.get('clips', [])),
+                    'results_path': results_path(item, args.output_dir),
+                    'error': results.get('error'),
+                    'seconds': results.get('timings', {}).get('total_seconds')
+                }
+            except Exception as e:
+                record = {'path': item['path'], 'status': 'failed', 'error': str(e)}
+
+            counts['completed' if record['status'] == 'completed' else 'failed'] += 1
+            with open(summary_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+            done = counts['completed'] + counts['failed']
+            print(f"[{done}/{len(pending)}] {record['status']}: {item['path']}")
+
+    elapsed = time.perf_counter() - started
+    print(f"\nBatch finished in {elapsed:.1f}s: {counts['completed']} completed, "
+          f"{counts['failed']} failed, {skipped} skipped")
+    print(f"Results: {summary_path}")
+    if counts['failed']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
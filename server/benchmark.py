@@ -0,0 +1,300 @@
+"""
+Reproducible, offline benchmark for the video processing pipeline
+
+Generates synthetic test media with FFmpeg (testsrc2 video + beeping sine
+audio), times each VideoProcessor stage across media sizes, clip counts and
+clip modes, writes a JSON report and compares it with a stored baseline.
+
+Usage:
+    python benchmark.py                      # run and compare with the baseline
+    python benchmark.py --save-baseline      # run and store the result as the new baseline
+    python benchmark.py --quick              # smallest media only
+    python benchmark.py --model tiny         # real Whisper instead of the stub backend
+
+Exits with status 1 when any stage is slower than the baseline by more than
+--tolerance, so it can gate performance changes. A missing baseline also
+fails unless --allow-missing-baseline (or --save-baseline) is given.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+import transcription
+from transcription import SAMPLE_RATE, TranscriptionBackend
+from video_processor import VideoProcessor
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# (name, duration seconds, resolution, video codec)
+MEDIA = [
+    ('short_360p_h264', 20, '640x360', 'libx264'),
+    ('medium_720p_h264', 90, '1280x720', 'libx264'),
+    ('medium_1080p_hevc', 90, '1920x1080', 'libx265'),
+]
+QUICK_MEDIA = MEDIA[:1]
+
+CLIP_COUNTS = [1, 3, 5]
+CLIP_MODES = ['ai', 'divide', 'range']
+CLIP_DURATION = 10  # Seconds per benchmark clip
+
+# Ignore differences smaller than this; tiny stages are too noisy to compare
+MIN_COMPARABLE_SECONDS = 0.05
+
+
+class StubBackend(TranscriptionBackend):
+    """Deterministic transcription backend so benchmarks don't depend on a model"""
+
+    name = 'stub'
+    SEGMENT_SECONDS = 5.0
+
+    def detect_language(self, audio):
+        return 'en', 1.0
+
+    def transcribe(self, audio, language, word_timestamps=False, initial_prompt=None):
+        duration = len(audio) / SAMPLE_RATE
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(start + self.SEGMENT_SECONDS, duration)
+            segments.append({'start': start, 'end': end, 'text': f" Segment at {start:.0f} seconds."})
+            start = end
+        return segments
+
+
+def generate_media(path, duration, resolution, codec):
+    """Create a synthetic video with a test pattern and beeping audio"""
+    cmd = [
+        'ffmpeg', '-nostdin', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f"testsrc2=size={resolution}:rate=30:duration={duration}",
+        '-f', 'lavfi', '-i', f"sine=frequency=440:beep_factor=4:duration={duration}",
+        '-c:v', codec, '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-shortest', '-y', path
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+    return path
+
+
+class StageFailed(Exception):
+    """A timed stage did not produce its output, so its timing is meaningless"""
+
+
+def time_call(func, repeat, check=None):
+    """Run func `repeat` times and return (median seconds, all runs, last result)
+
+    check(result) must return True for every run; a failed stage is usually
+    fast and would otherwise pass the gate as an improvement.
+    """
+    runs = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        runs.append(round(time.perf_counter() - started, 4))
+        if check and not check(result):
+            raise StageFailed(getattr(func, '__name__', 'stage'))
+    return statistics.median(runs), runs, result
+
+
+def _exists(path):
+    return bool(path) and os.path.exists(path) and os.path.getsize(path) > 0
+
+
+def benchmark_media(name, video_path, work_dir, repeat, model):
+    """Time every stage for one source video"""
+    results = {}
+
+    def record(stage, func, check=None):
+        try:
+            median, runs, result = time_call(func, repeat, check)
+        except StageFailed:
+            raise StageFailed(f"{name}/{stage} did not produce its output")
+        results[f"{name}/{stage}"] = {'median_seconds': median, 'runs': runs}
+        print(f"  {stage:<40} {median:8.3f}s")
+        return result
+
+    processor = VideoProcessor(video_path, work_dir)
+    info = record('get_video_info', processor.get_video_info, lambda i: i['duration'] > 0)
+
+    backend = 'stub' if model == 'stub' else None
+    model_size = 'tiny' if model == 'stub' else model
+    speech_map_path = os.path.join(work_dir, f"{processor.video_id}_speech.json")
+
+    def subtitles():
+        # Drop the cached speech map so every run includes the VAD pass
+        if os.path.exists(speech_map_path):
+            os.remove(speech_map_path)
+        return processor.generate_subtitles(language='en', model_size=model_size, backend=backend)
+
+    subtitle_path, transcript = record(
+        'generate_subtitles', subtitles,
+        lambda r: _exists(r[0]) and len(r[1]['segments']) > 0
+    )
+
+    for mode in CLIP_MODES:
+        for count in CLIP_COUNTS:
+            options = {
+                'clip_mode': mode,
+                'num_clips': count,
+                'clip_duration': CLIP_DURATION,
+                'start_time': 0,
+                'end_time': info['duration']
+            }
+            record(f"fallback_analysis/{mode}/{count}", lambda: processor._fallback_analysis(transcript, options),
+                   lambda a: 'clips' in a)
+
+    record('generate_thumbnail', lambda: processor.generate_thumbnail(time_offset=1), _exists)
+
+    for count in CLIP_COUNTS:
+        clips = processor._fallback_analysis(
+            transcript, {'clip_mode': 'divide', 'num_clips': count, 'clip_duration': CLIP_DURATION}
+        )['clips']
+        if not clips:
+            raise StageFailed(f"{name}/fallback_analysis/divide/{count} planned no clips")
+
+        def cut_clips(add_subtitles):
+            created = []
+            for i, clip in enumerate(clips):
+                clip_path = os.path.join(work_dir, f"{processor.video_id}_clip_{i + 1}.mp4")
+                if not processor.create_clip(clip['start_time'], clip['end_time'], clip_path,
+                                             add_subtitles=add_subtitles, subtitle_path=subtitle_path):
+                    return None
+                created.append({**clip, 'file_path': clip_path,
+                                'duration': clip['end_time'] - clip['start_time']})
+            return created
+
+        def clips_ok(created):
+            return created is not None and len(created) == len(clips) and \
+                all(_exists(c['file_path']) for c in created)
+
+        record(f"create_clip/{count}/plain", lambda: cut_clips(False), clips_ok)
+        created = record(f"create_clip/{count}/subtitles", lambda: cut_clips(True), clips_ok)
+
+        def thumbnails():
+            # Remove cached posters so every run measures generation
+            for clip in created:
+                base = os.path.splitext(clip['file_path'])[0]
+                for suffix in ('_thumb.jpg', '_sprite.jpg'):
+                    if os.path.exists(base + suffix):
+                        os.remove(base + suffix)
+            return processor.generate_clip_thumbnails([dict(c) for c in created], sprite=True)
+
+        def thumbnails_ok(result):
+            return all(_exists(c['thumbnail_path']) and _exists(c.get('sprite', {}).get('path'))
+                       for c in result)
+
+        record(f"generate_clip_thumbnails/{count}", thumbnails, thumbnails_ok)
+
+    return results
+
+
+def environment():
+    """Describe the machine so reports are only compared like for like"""
+    try:
+        ffmpeg = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True).stdout.splitlines()[0]
+    except (OSError, IndexError):
+        ffmpeg = 'unknown'
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'ffmpeg': ffmpeg
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Return stages that got slower than the baseline allows"""
+    regressions = []
+    for key, current in report['results'].items():
+        previous = baseline.get('results', {}).get(key)
+        if not previous:
+            continue
+        before = previous['median_seconds']
+        after = current['median_seconds']
+        if after - before > MIN_COMPARABLE_SECONDS and after > before * (1 + tolerance):
+            regressions.append({
+                'stage': key,
+                'baseline_seconds': before,
+                'current_seconds': after,
+                'ratio': round(after / before, 2) if before else None
+            })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the video processing pipeline')
+    parser.add_argument('--quick', action='store_true', help='Only benchmark the smallest media')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage (median is reported)')
+    parser.add_argument('--model', default='stub', help="'stub' or a Whisper size such as 'tiny'")
+    parser.add_argument('--output', default='benchmark_report.json', help='Where to write the report')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline report to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown ratio (0.2 = 20%%)')
+    parser.add_argument('--allow-missing-baseline', action='store_true',
+                        help="Don't fail when there is no baseline to compare against")
+    parser.add_argument('--keep', action='store_true', help='Keep the generated media and outputs')
+    args = parser.parse_args()
+
+    transcription.BACKENDS[StubBackend.name] = StubBackend
+
+    work_dir = tempfile.mkdtemp(prefix='clipforge_bench_')
+    report = {'environment': environment(), 'model': args.model, 'repeat': args.repeat, 'results': {}}
+
+    try:
+        for name, duration, resolution, codec in (QUICK_MEDIA if args.quick else MEDIA):
+            print(f"\n{name} ({duration}s, {resolution}, {codec})")
+            video_path = generate_media(os.path.join(work_dir, f"{name}.mp4"), duration, resolution, codec)
+            report['results'].update(benchmark_media(name, video_path, work_dir, args.repeat, args.model))
+    except StageFailed as e:
+        print(f"\n❌ Benchmark aborted: {e}")
+        sys.exit(1)
+    finally:
+        if args.keep:
+            print(f"\nBenchmark files kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    missing_baseline = not args.save_baseline and not os.path.exists(args.baseline)
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('environment') != report['environment']:
+            print("\n⚠️ Baseline was recorded on a different environment; comparison is indicative only")
+        report['regressions'] = compare(report, baseline, args.tolerance)
+    else:
+        report['regressions'] = []
+    report['baseline'] = None if missing_baseline else args.baseline
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to: {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to: {args.baseline}")
+
+    if report['regressions']:
+        print(f"\n❌ {len(report['regressions'])} stage(s) slower than baseline:")
+        for r in report['regressions']:
+            print(f"  {r['stage']}: {r['baseline_seconds']}s -> {r['current_seconds']}s (x{r['ratio']})")
+        sys.exit(1)
+
+    if missing_baseline:
+        print(f"\n⚠️ No baseline at {args.baseline}: nothing was compared "
+              f"(record one with --save-baseline)")
+        if not args.allow_missing_baseline:
+            sys.exit(1)
+        return
+
+    print("\n✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
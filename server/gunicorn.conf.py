@@ -0,0 +1,37 @@
+"""
+Gunicorn settings for the Flask video processing server
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master and workers are forked from it, so
+imported libraries (and models listed in PRELOAD_MODELS) are shared
+copy-on-write instead of being loaded again by every worker.
+
+Job progress, cancellation handles and metrics live in memory per worker,
+so the default is a single worker with threads: /progress, /cancel and
+/metrics must reach the worker that owns the job. Only raise
+GUNICORN_WORKERS behind sticky routing per video id.
+"""
+import gc
+import os
+
+bind = os.getenv('GUNICORN_BIND', '127.0.0.1:5001')
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))  # Job state is per worker (see above)
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '0'))  # Processing requests are long-running
+preload_app = True
+
+# Comma-separated Whisper sizes to load before forking, e.g. "tiny,base"
+PRELOAD_MODELS = [m for m in os.getenv('PRELOAD_MODELS', '').split(',') if m]
+
+
+def on_starting(server):
+    """Load heavy dependencies in the master before any worker is forked"""
+    from video_processor import warm_up
+    warm_up(PRELOAD_MODELS)
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the GC's reach, so collections in
+    # workers don't touch (and un-share) the master's pages
+    gc.freeze()
@@ -0,0 +1,165 @@
+"""
+Keyframe and scene-change index of a video
+
+Built once per media file with two cheap passes and cached next to it as
+`{media_stem}_index.npz`:
+
+    keyframes       float64 keyframe timestamps (ffprobe packet flags, no decode)
+    scene_times     float64 timestamps of candidate shot changes
+    scene_scores    float32 FFmpeg scene score (0-1) of each candidate
+
+The scene pass keeps every frame whose score exceeds SCENE_MIN_SCORE, so
+callers can pick their own threshold. By default it only decodes keyframes
+(`-skip_frame nokey`): encoders place keyframes at shot changes, so cuts are
+still found at a small fraction of the decode cost. A full decode of every
+frame is reserved for cheap inputs (proxies, short sources).
+All arrays are sorted; lookups use np.searchsorted.
+"""
+import os
+import numpy as np
+
+FORMAT_VERSION = 1
+SCENE_MIN_SCORE = 0.1  # Candidates stored in the index
+SCENE_CUT_SCORE = float(os.getenv('SCENE_CUT_SCORE', '0.3'))  # Treated as a real cut
+SCENE_ANALYSIS_WIDTH = 160  # Frames are scaled down before scoring
+
+
+def keyframe_command(media_path):
+    """ffprobe reading packet flags only, so nothing is decoded"""
+    return [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        media_path
+    ]
+
+
+def scene_command(media_path, keyframes_only=True):
+    """ffmpeg pass printing the scene score of every candidate frame to stdout"""
+    skip = ['-skip_frame', 'nokey'] if keyframes_only else []
+    return [
+        'ffmpeg',
+        '-nostdin',
+        '-an', '-sn', '-dn',
+        *skip,
+        '-i', media_path,
+        '-vf', (f"scale={SCENE_ANALYSIS_WIDTH}:-2,"
+                f"select='gt(scene,{SCENE_MIN_SCORE})',metadata=print:file=-"),
+        '-f', 'null',
+        '-'
+    ]
+
+
+def parse_keyframes(output):
+    """Keyframe times from `pts_time,flags` lines"""
+    times = []
+    for line in output.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) >= 2 and 'K' in parts[1]:
+            try:
+                times.append(float(parts[0]))
+            except ValueError:  # 'N/A' timestamps
+                continue
+    return np.unique(np.array(times, dtype=np.float64))
+
+
+def parse_scenes(output):
+    """(times, scores) from the metadata filter's frame/score line pairs"""
+    times = []
+    scores = []
+    current_time = None
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith('frame:') and 'pts_time:' in line:
+            try:
+                current_time = float(line.split('pts_time:')[1].split()[0])
+            except ValueError:
+                current_time = None
+        elif line.startswith('lavfi.scene_score=') and current_time is not None:
+            times.append(current_time)
+            scores.append(float(line.split('=', 1)[1]))
+            current_time = None
+
+    order = np.argsort(times, kind='stable')
+    return (np.array(times, dtype=np.float64)[order],
+            np.array(scores, dtype=np.float32)[order])
+
+
+class MediaIndex:
+    """Sorted keyframe and scene-change arrays with snapping helpers"""
+
+    def __init__(self, keyframes, scene_times, scene_scores):
+        self.keyframes = keyframes
+        self.scene_times = scene_times
+        self.scene_scores = scene_scores
+
+    def is_keyframe(self, time, epsilon=0.001):
+        """Whether a keyframe sits at `time`"""
+        idx = int(np.searchsorted(self.keyframes, time - epsilon))
+        return idx < len(self.keyframes) and self.keyframes[idx] <= time + epsilon
+
+    def keyframe_before(self, time, tolerance):
+        """Latest keyframe at or before `time` within tolerance, else `time`"""
+        idx = int(np.searchsorted(self.keyframes, time, side='right')) - 1
+        if idx >= 0 and time - self.keyframes[idx] <= tolerance:
+            return float(self.keyframes[idx])
+        return time
+
+    def scene_cuts(self, threshold=SCENE_CUT_SCORE):
+        """Times of shot changes scoring at least `threshold`"""
+        return self.scene_times[self.scene_scores >= threshold]
+
+    def nearest_cut(self, time, tolerance, threshold=SCENE_CUT_SCORE):
+        """Closest shot change within tolerance, else `time`"""
+        cuts = self.scene_cuts(threshold)
+        if len(cuts) == 0:
+            return time
+        idx = int(np.searchsorted(cuts, time))
+        candidates = [cuts[i] for i in (idx - 1, idx) if 0 <= i < len(cuts)]
+        best = min(candidates, key=lambda c: abs(c - time))
+        return float(best) if abs(best - time) <= tolerance else time
+
+    def top_cuts(self, limit, threshold=SCENE_CUT_SCORE):
+        """Strongest shot changes as [(time, score)] in time order"""
+        mask = self.scene_scores >= threshold
+        times = self.scene_times[mask]
+        scores = self.scene_scores[mask]
+        strongest = np.sort(np.argsort(scores)[::-1][:limit])
+        return [(round(float(times[i]), 2), round(float(scores[i]), 2)) for i in strongest]
+
+
+def build_index(media_path, run, keyframes_only=True):
+    """Run both passes; `run(cmd, name)` returns a CompletedProcess with text stdout"""
+    keyframes = parse_keyframes(run(keyframe_command(media_path), 'ffprobe_keyframes').stdout)
+    scene_times, scene_scores = parse_scenes(
+        run(scene_command(media_path, keyframes_only), 'ffmpeg_scenes').stdout)
+    return MediaIndex(keyframes, scene_times, scene_scores)
+
+
+def save_index(index, path):
+    """Write the index atomically as a compressed .npz"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        np.savez_compressed(
+            f,
+            version=np.array(FORMAT_VERSION),
+            keyframes=index.keyframes,
+            scene_times=index.scene_times,
+            scene_scores=index.scene_scores
+        )
+    os.replace(temp_path, path)
+
+
+def load_index(path):
+    """Load a cached index, or None if missing or from another format version"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if int(data['version']) != FORMAT_VERSION:
+                return None
+            return MediaIndex(data['keyframes'], data['scene_times'], data['scene_scores'])
+    except (OSError, KeyError, ValueError):
+        return None
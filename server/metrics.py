@@ -0,0 +1,213 @@
+"""
+Per-stage timing instrumentation and Prometheus-style metrics
+
+    trace = JobTrace(video_id)
+    with trace.stage('transcription'):
+        ...
+    trace.cache('proxy', hit=True)
+    trace.summary()          # attached to the /process response
+
+Several jobs share one process, so process-level counters (CPU time,
+I/O, RSS) can't be split between them. In-process stages therefore report
+wall time plus *process-wide* CPU time, labelled as such; per-job CPU,
+memory and I/O come from the rusage of each ffmpeg/ffprobe child, which
+subprocess_runner collects when it reaps the process.
+
+Every finished stage is also folded into the process-wide REGISTRY, which
+app.py serves at /metrics in the Prometheus text format.
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Histogram buckets (seconds) for stage and subprocess durations
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+class Registry:
+    """Thread-safe store of counters, gauges and histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._values = {}
+        self._histograms = {}
+
+    def _declare(self, name, kind, help_text):
+        self._types.setdefault(name, kind)
+        self._help.setdefault(name, help_text)
+
+    def inc(self, name, value=1, help_text='', **labels):
+        """Increase a counter"""
+        with self._lock:
+            self._declare(name, 'counter', help_text)
+            key = (name, tuple(sorted(labels.items())))
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, help_text='', **labels):
+        """Set a gauge"""
+        with self._lock:
+            self._declare(name, 'gauge', help_text)
+            self._values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, help_text='', buckets=DURATION_BUCKETS, **labels):
+        """Record one histogram sample"""
+        with self._lock:
+            self._declare(name, 'histogram', help_text)
+            key = (name, tuple(sorted(labels.items())))
+            if key not in self._histograms:
+                self._histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            hist = self._histograms[key]
+            for i, bound in enumerate(hist['buckets']):
+                if value <= bound:
+                    hist['counts'][i] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+
+    def render(self):
+        """Serialise everything in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name in sorted(self._types):
+                if self._help[name]:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {self._types[name]}")
+
+                for (key_name, labels), value in sorted(self._values.items()):
+                    if key_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+                for (key_name, labels), hist in sorted(self._histograms.items()):
+                    if key_name != name:
+                        continue
+                    for bound, count in zip(hist['buckets'], hist['counts']):
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {hist['count']}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+REGISTRY = Registry()
+
+
+def peak_rss_bytes(children=False):
+    """Peak resident set size of this process (or of its reaped children)"""
+    if resource is None:
+        return 0
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    return resource.getrusage(who).ru_maxrss * 1024  # KB on Linux
+
+
+def child_usage(rusage):
+    """Per-child numbers from an os.wait4 rusage"""
+    return {
+        'child_cpu_seconds': round(rusage.ru_utime + rusage.ru_stime, 4),
+        'child_peak_rss_mb': round(rusage.ru_maxrss / 1024, 1),  # KB on Linux
+        'bytes_read': rusage.ru_inblock * 512,  # 512-byte blocks
+        'bytes_written': rusage.ru_oublock * 512
+    }
+
+
+class JobTrace:
+    """Collects stage timings, cache hits/misses and queue wait for one job"""
+
+    def __init__(self, job_id=None):
+        self.job_id = job_id
+        self.stages = []
+        self.caches = {}
+        self.queue_wait_seconds = 0.0
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, kind='stage'):
+        """Measure wall time of a block; yields a dict for extra per-job numbers"""
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        extra = {}
+        status = 'ok'
+        try:
+            yield extra
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            record = {
+                'stage': name,
+                'kind': kind,
+                'status': status,
+                'wall_seconds': round(time.perf_counter() - wall_start, 4),
+                # Includes other jobs' threads running at the same time
+                'process_cpu_seconds': round(time.process_time() - cpu_start, 4),
+                **extra
+            }
+            with self._lock:
+                self.stages.append(record)
+            self._export(record)
+
+    def subprocess(self, name):
+        """Measure one child process (ffmpeg/ffprobe); fill the yielded dict with child_usage()"""
+        return self.stage(name, kind='subprocess')
+
+    def cache(self, name, hit):
+        """Count a cache lookup"""
+        with self._lock:
+            counts = self.caches.setdefault(name, {'hits': 0, 'misses': 0})
+            counts['hits' if hit else 'misses'] += 1
+        REGISTRY.inc('clipforge_cache_requests_total', help_text='Cache lookups by cache and result',
+                     cache=name, result='hit' if hit else 'miss')
+
+    def queue_wait(self, seconds):
+        """Add time spent waiting for a slot (queue, concurrency cap)"""
+        with self._lock:
+            self.queue_wait_seconds += seconds
+        REGISTRY.observe('clipforge_queue_wait_seconds', seconds, help_text='Time jobs spent waiting for a slot')
+
+    def _export(self, record):
+        name = record['stage']
+        if record['kind'] == 'subprocess':
+            REGISTRY.observe('clipforge_subprocess_seconds', record['wall_seconds'],
+                             help_text='Wall time of ffmpeg/ffprobe invocations', command=name)
+            if 'child_cpu_seconds' in record:
+                REGISTRY.inc('clipforge_subprocess_cpu_seconds_total', record['child_cpu_seconds'],
+                             help_text='CPU time of ffmpeg/ffprobe children', command=name)
+                REGISTRY.inc('clipforge_subprocess_bytes_read_total', record['bytes_read'],
+                             help_text='Bytes ffmpeg/ffprobe children read from storage', command=name)
+                REGISTRY.inc('clipforge_subprocess_bytes_written_total', record['bytes_written'],
+                             help_text='Bytes ffmpeg/ffprobe children wrote to storage', command=name)
+        else:
+            REGISTRY.observe('clipforge_stage_seconds', record['wall_seconds'],
+                             help_text='Wall time of pipeline stages', stage=name)
+        if record['status'] == 'error':
+            REGISTRY.inc('clipforge_stage_errors_total', help_text='Stages that raised', stage=name)
+
+    def summary(self):
+        """Per-job report attached to pipeline results"""
+        with self._lock:
+            children = [s for s in self.stages if 'child_cpu_seconds' in s]
+            return {
+                'total_seconds': round(time.perf_counter() - self._started, 3),
+                'queue_wait_seconds': round(self.queue_wait_seconds, 3),
+                # Only this job's ffmpeg/ffprobe children; in-process work is process-wide
+                'child_cpu_seconds': round(sum(s['child_cpu_seconds'] for s in children), 3),
+                'child_peak_rss_mb': max((s['child_peak_rss_mb'] for s in children), default=0),
+                'stages': list(self.stages),
+                'cache': {name: dict(counts) for name, counts in self.caches.items()}
+            }
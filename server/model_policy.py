@@ -0,0 +1,83 @@
+"""
+Whisper model-size selection under a per-job latency budget
+
+Picks the largest model whose estimated transcription time fits the budget,
+given how much audio there is and how many other jobs are competing for the
+CPU. When the service is saturated it drops straight to the smallest model
+so latency stays bounded instead of the queue growing.
+"""
+import os
+
+MODEL_SIZES = ['tiny', 'base', 'small', 'medium', 'large']
+
+# Rough CPU processing seconds per second of audio (fp32, single job)
+CPU_REALTIME_FACTORS = {
+    'tiny': 0.06,
+    'base': 0.12,
+    'small': 0.4,
+    'medium': 1.1,
+    'large': 2.2
+}
+
+# Speed-up of each transcription backend over fp32 openai-whisper
+BACKEND_SPEEDUPS = {
+    'whisper': 1.0,
+    'whisper-int8': 1.6,
+    'faster-whisper': 4.0
+}
+
+DEFAULT_LATENCY_BUDGET = float(os.getenv('TRANSCRIBE_LATENCY_BUDGET', '180'))  # Seconds
+MIN_MODEL = os.getenv('WHISPER_MIN_MODEL', 'tiny')
+MAX_MODEL = os.getenv('WHISPER_MAX_MODEL', 'small')
+SATURATION_QUEUE_DEPTH = int(os.getenv('SATURATION_QUEUE_DEPTH', '4'))
+
+
+def _clamp(size):
+    """Keep a model size inside the configured [MIN_MODEL, MAX_MODEL] range"""
+    index = MODEL_SIZES.index(size)
+    index = max(index, MODEL_SIZES.index(MIN_MODEL))
+    index = min(index, MODEL_SIZES.index(MAX_MODEL))
+    return MODEL_SIZES[index]
+
+
+def estimate_seconds(size, audio_seconds, queue_depth=0, backend='whisper'):
+    """Estimated wall time to transcribe audio_seconds with this model"""
+    # Jobs running alongside this one share the CPU
+    speedup = BACKEND_SPEEDUPS.get(backend, 1.0)
+    return audio_seconds * CPU_REALTIME_FACTORS[size] * (1 + queue_depth) / speedup
+
+
+def select_model_size(audio_seconds, queue_depth=0, latency_budget=None, requested=None, backend='whisper'):
+    """Choose a Whisper model size and explain why"""
+    if latency_budget is None:
+        latency_budget = DEFAULT_LATENCY_BUDGET
+    latency_budget = float(latency_budget)
+
+    choice = {
+        'backend': backend,
+        'audio_seconds': round(audio_seconds, 1),
+        'queue_depth': queue_depth,
+        'latency_budget': latency_budget
+    }
+
+    if requested and requested != 'auto' and requested in MODEL_SIZES:
+        size = _clamp(requested)
+        reason = 'requested' if size == requested else f"requested {requested}, clamped to {size}"
+    elif queue_depth >= SATURATION_QUEUE_DEPTH:
+        size = _clamp(MIN_MODEL)
+        reason = f"saturated ({queue_depth} jobs queued)"
+    else:
+        # Largest allowed model that fits the budget, else the smallest one
+        candidates = MODEL_SIZES[MODEL_SIZES.index(MIN_MODEL):MODEL_SIZES.index(MAX_MODEL) + 1]
+        size = candidates[0]
+        reason = 'no model fits budget'
+        for candidate in reversed(candidates):
+            if estimate_seconds(candidate, audio_seconds, queue_depth, backend) <= latency_budget:
+                size = candidate
+                reason = 'fits budget'
+                break
+
+    choice['model'] = size
+    choice['reason'] = reason
+    choice['estimated_seconds'] = round(estimate_seconds(size, audio_seconds, queue_depth, backend), 1)
+    return choice
@@ -0,0 +1,173 @@
+"""
+Shared runner for FFmpeg/FFprobe child processes
+
+Replaces blocking `subprocess.run(..., capture_output=True)` with:
+  - a global cap on concurrent children (FFMPEG_MAX_PROCS)
+  - per-command timeouts
+  - cancellation through a threading.Event, killing the whole process group
+  - streamed `-progress` parsing for FFmpeg, reported as a 0-1 fraction
+  - only the tail of stderr kept in memory instead of the whole log
+  - the child's own rusage (CPU, peak RSS, block I/O) via os.wait4 on POSIX
+
+Children are supervised from the calling thread with reader threads for the
+pipes, which fits the threaded Flask server and the batch CLI alike.
+"""
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+
+MAX_CHILDREN = int(os.getenv('FFMPEG_MAX_PROCS', str(os.cpu_count() or 2)))
+STDERR_TAIL_LINES = 50
+POLL_SECONDS = 0.2
+KILL_GRACE_SECONDS = 5
+
+_slots = threading.BoundedSemaphore(MAX_CHILDREN)
+
+
+class JobCancelled(Exception):
+    """Raised when a job is cancelled while a child process is running"""
+
+
+def _wait(proc, timeout):
+    """Wait up to `timeout` seconds for the child to exit; stores its rusage when available"""
+    if not hasattr(os, 'wait4'):
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            pass
+        return proc.returncode is not None
+
+    # Reap the child ourselves (instead of Popen.wait) to get its resource usage
+    deadline = time.monotonic() + timeout
+    while proc.returncode is None:
+        try:
+            pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+        except ChildProcessError:  # Already reaped elsewhere
+            proc.poll()
+            return True
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            proc.rusage = rusage
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def _terminate(proc):
+    """Stop a child and everything it spawned"""
+    if proc.returncode is not None:
+        return
+    try:
+        if os.name == 'posix':
+            os.killpg(proc.pid, signal.SIGTERM)
+        else:
+            proc.terminate()
+        if _wait(proc, KILL_GRACE_SECONDS):
+            return
+        if os.name == 'posix':
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except ProcessLookupError:
+        pass
+    _wait(proc, KILL_GRACE_SECONDS)
+
+
+def _with_progress(cmd):
+    """Ask FFmpeg for machine-readable progress on stderr"""
+    return [cmd[0], '-nostats', '-progress', 'pipe:2'] + list(cmd[1:])
+
+
+def run(cmd, check=False, text=False, timeout=None, cancel_event=None,
+        progress_callback=None, duration=None, on_wait=None, on_exit=None):
+    """Run a command to completion and return a subprocess.CompletedProcess
+
+    progress_callback(fraction) is called as FFmpeg reports `out_time`,
+    relative to `duration` seconds of output. on_wait(seconds) receives the
+    time spent waiting for a free child slot, on_exit(rusage) the child's
+    resource usage once it has been reaped (POSIX only; also on failure).
+    """
+    if progress_callback and duration:
+        cmd = _with_progress(cmd)
+
+    # The timeout covers waiting for a slot as well as running
+    deadline = time.monotonic() + timeout if timeout else None
+    wait_started = time.perf_counter()
+    while not _slots.acquire(timeout=POLL_SECONDS):
+        if cancel_event is not None and cancel_event.is_set():
+            raise JobCancelled(f"Cancelled while waiting for a slot: {cmd[0]}")
+        if deadline and time.monotonic() > deadline:
+            raise subprocess.TimeoutExpired(cmd, timeout, stderr='Timed out waiting for a free FFmpeg slot')
+
+    try:
+        if on_wait:
+            on_wait(time.perf_counter() - wait_started)
+        if cancel_event is not None and cancel_event.is_set():
+            raise JobCancelled(f"Cancelled before start: {cmd[0]}")
+
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=(os.name == 'posix')
+        )
+
+        stdout_chunks = []
+        stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+
+        def read_stdout():
+            for chunk in iter(lambda: proc.stdout.read(1 << 16), b''):
+                stdout_chunks.append(chunk)
+
+        def read_stderr():
+            for raw in proc.stderr:
+                line = raw.decode('utf-8', errors='replace').rstrip()
+                if progress_callback and duration and line.startswith('out_time_us='):
+                    try:
+                        seconds = int(line.split('=', 1)[1]) / 1_000_000
+                        progress_callback(min(max(seconds / duration, 0.0), 1.0))
+                    except ValueError:  # 'N/A' before the first frame
+                        pass
+                    continue
+                if progress_callback and duration and '=' in line and ' ' not in line:
+                    continue  # Other -progress key=value lines
+                stderr_tail.append(line)
+
+        readers = [threading.Thread(target=read_stdout, daemon=True),
+                   threading.Thread(target=read_stderr, daemon=True)]
+        for reader in readers:
+            reader.start()
+
+        try:
+            while not _wait(proc, POLL_SECONDS):
+                if cancel_event is not None and cancel_event.is_set():
+                    _terminate(proc)
+                    raise JobCancelled(f"Cancelled: {cmd[0]}")
+                if deadline and time.monotonic() > deadline:
+                    _terminate(proc)
+                    raise subprocess.TimeoutExpired(cmd, timeout, stderr='\n'.join(stderr_tail))
+        finally:
+            _terminate(proc)
+            for reader in readers:
+                reader.join()
+            proc.stdout.close()
+            proc.stderr.close()
+            if on_exit and getattr(proc, 'rusage', None) is not None:
+                on_exit(proc.rusage)
+    finally:
+        _slots.release()
+
+    stdout = b''.join(stdout_chunks)
+    if text:
+        stdout = stdout.decode('utf-8', errors='replace')
+    stderr = '\n'.join(stderr_tail)
+
+    if check and proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
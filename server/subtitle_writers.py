@@ -0,0 +1,146 @@
+"""
+Incremental subtitle and transcript writers
+
+Each writer streams segments into `<path>.part` through a buffered file and
+renames it over `<path>` on close, so readers never see a half-written file
+and a crash never clobbers the previous good output.
+
+The JSON transcript keeps one segment per line, so the segments committed
+before a crash can be read back from its `.part` file and transcription
+resumed after them (see read_partial_transcript).
+"""
+import os
+import json
+
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
+def format_timestamp(seconds, decimal_marker='.'):
+    """Format seconds as HH:MM:SS.mmm (SRT uses ',' as the marker)"""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{decimal_marker}{millis:03d}"
+
+
+class _AtomicWriter:
+    """Buffered writer that only replaces the target file on close"""
+
+    def __init__(self, path):
+        self.path = path
+        self.part_path = path + '.part'
+        self.count = 0
+        self._file = open(self.part_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+
+    def flush(self):
+        """Push buffered data to the .part file so partial output is readable"""
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+        os.replace(self.part_path, self.path)
+        return self.path
+
+    def abort(self):
+        """Drop the partial output and leave any previous file untouched"""
+        self._file.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+
+class VttWriter(_AtomicWriter):
+    """Stream segments as WebVTT cues"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._file.write("WEBVTT\n\n")
+
+    def write_segment(self, segment):
+        self.count += 1
+        self._file.write(
+            f"{self.count}\n"
+            f"{format_timestamp(segment['start'])} --> {format_timestamp(segment['end'])}\n"
+            f"{segment['text'].strip()}\n\n"
+        )
+
+
+class SrtWriter(_AtomicWriter):
+    """Stream segments as SubRip cues"""
+
+    def write_segment(self, segment):
+        self.count += 1
+        self._file.write(
+            f"{self.count}\n"
+            f"{format_timestamp(segment['start'], ',')} --> {format_timestamp(segment['end'], ',')}\n"
+            f"{segment['text'].strip()}\n\n"
+        )
+
+
+class JsonTranscriptWriter(_AtomicWriter):
+    """Stream segments into a compact JSON transcript, one segment per line"""
+
+    def __init__(self, path, language='unknown'):
+        super().__init__(path)
+        self._file.write('{"detected_language":')
+        self._file.write(json.dumps(language))
+        self._file.write(',"segments":[')
+
+    def write_segment(self, segment):
+        if self.count:
+            self._file.write(',')
+        self.count += 1
+        self._file.write('\n')
+        self._file.write(json.dumps(segment, ensure_ascii=False, separators=(',', ':')))
+
+    def close(self, text=''):
+        self._file.write('\n],"text":')
+        self._file.write(json.dumps(text, ensure_ascii=False))
+        self._file.write('}')
+        return super().close()
+
+
+def read_partial_transcript(path):
+    """(language, segments) committed to `<path>.part` by an interrupted writer, or None"""
+    try:
+        with open(path + '.part', encoding='utf-8') as f:
+            header = f.readline()
+            language = json.loads(header.strip() + ']}')['detected_language']
+            segments = []
+            for line in f:
+                try:
+                    segments.append(json.loads(line.strip().rstrip(',')))
+                except ValueError:  # Truncated last line or the closing line
+                    break
+    except (OSError, ValueError, KeyError):
+        return None
+    return language, segments
+
+
+class TranscriptStreamWriter:
+    """Fan segments out to the VTT, SRT and JSON outputs of one transcription"""
+
+    def __init__(self, vtt_path, srt_path, json_path, language='unknown'):
+        self.vtt = VttWriter(vtt_path)
+        self.srt = SrtWriter(srt_path)
+        self.json = JsonTranscriptWriter(json_path, language)
+
+    def write_segment(self, segment):
+        self.vtt.write_segment(segment)
+        self.srt.write_segment(segment)
+        self.json.write_segment(segment)
+
+    def flush(self):
+        self.vtt.flush()
+        self.srt.flush()
+        self.json.flush()
+
+    def close(self, text=''):
+        self.srt.close()
+        self.json.close(text=text)
+        return self.vtt.close()
+
+    def abort(self):
+        self.vtt.abort()
+        self.srt.abort()
+        self.json.abort()
@@ -0,0 +1,217 @@
+"""
+Compact columnar transcript storage
+
+A transcript is stored as a directory of flat NumPy arrays instead of one large
+JSON document:
+
+    {video_id}_transcript/
+        meta.json            language, counts, format version
+        seg_start.npy        float64 segment start times (sorted)
+        seg_end.npy          float64 segment end times
+        seg_offsets.npy      int64 byte offsets into seg_text.bin (n + 1)
+        seg_text.bin         UTF-8 segment text blob
+        word_*.npy / .bin    same layout for words (word timestamp mode only)
+        word_segment.npy     int32 index of the segment each word belongs to
+
+Arrays are memory-mapped on load, so reading the words of a 30 second window
+from a multi-hour podcast only touches the pages for that window.
+"""
+import os
+import json
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def _pack_text(texts):
+    """Join strings into a UTF-8 blob plus an offsets array"""
+    encoded = [t.encode('utf-8') for t in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return b''.join(encoded), offsets
+
+
+def _write_array(directory, name, array):
+    """Write one .npy file atomically"""
+    path = os.path.join(directory, f"{name}.npy")
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(temp_path, path)
+
+
+def _write_blob(directory, name, blob):
+    """Write one text blob atomically"""
+    path = os.path.join(directory, f"{name}.bin")
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(blob)
+    os.replace(temp_path, path)
+
+
+def save_transcript(transcript, directory):
+    """Save a Whisper-style transcript dict in columnar form"""
+    os.makedirs(directory, exist_ok=True)
+    segments = transcript.get('segments', [])
+
+    seg_text, seg_offsets = _pack_text([s['text'] for s in segments])
+    _write_array(directory, 'seg_start', np.array([s['start'] for s in segments], dtype=np.float64))
+    _write_array(directory, 'seg_end', np.array([s['end'] for s in segments], dtype=np.float64))
+    _write_array(directory, 'seg_offsets', seg_offsets)
+    _write_blob(directory, 'seg_text', seg_text)
+
+    words = []
+    word_segment = []
+    for i, segment in enumerate(segments):
+        for word in segment.get('words') or []:
+            words.append(word)
+            word_segment.append(i)
+
+    if words:
+        word_text, word_offsets = _pack_text([w['word'] for w in words])
+        _write_array(directory, 'word_start', np.array([w['start'] for w in words], dtype=np.float64))
+        _write_array(directory, 'word_end', np.array([w['end'] for w in words], dtype=np.float64))
+        _write_array(directory, 'word_offsets', word_offsets)
+        _write_array(directory, 'word_segment', np.array(word_segment, dtype=np.int32))
+        _write_blob(directory, 'word_text', word_text)
+
+    # Metadata goes last so a half-written store is never picked up
+    meta = {
+        'version': FORMAT_VERSION,
+        'language': transcript.get('detected_language', transcript.get('language', 'unknown')),
+        'segments': len(segments),
+        'words': len(words)
+    }
+    meta_path = os.path.join(directory, 'meta.json')
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+
+    return directory
+
+
+def load_transcript(directory):
+    """Open a columnar transcript, or return None if there is none"""
+    if not os.path.exists(os.path.join(directory, 'meta.json')):
+        return None
+    return TranscriptStore(directory)
+
+
+class TranscriptStore:
+    """Lazy, memory-mapped view over a columnar transcript"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.language = self.meta.get('language', 'unknown')
+        self.has_words = self.meta.get('words', 0) > 0
+        self._arrays = {}
+
+    def _array(self, name):
+        """Memory-map an array on first use"""
+        if name not in self._arrays:
+            path = os.path.join(self.directory, f"{name}.npy")
+            self._arrays[name] = np.load(path, mmap_mode='r')
+        return self._arrays[name]
+
+    def _blob(self, name):
+        """Memory-map a text blob on first use"""
+        if name not in self._arrays:
+            path = os.path.join(self.directory, f"{name}.bin")
+            if os.path.getsize(path) == 0:
+                self._arrays[name] = np.zeros(0, dtype=np.uint8)
+            else:
+                self._arrays[name] = np.memmap(path, dtype=np.uint8, mode='r')
+        return self._arrays[name]
+
+    def _end_max(self, prefix):
+        """Running maximum of end times, so overlap lookups can use binary search"""
+        key = f"{prefix}_end_max"
+        if key not in self._arrays:
+            self._arrays[key] = np.maximum.accumulate(self._array(f"{prefix}_end"))
+        return self._arrays[key]
+
+    def _text(self, prefix, index):
+        offsets = self._array(f"{prefix}_offsets")
+        blob = self._blob(f"{prefix}_text")
+        return bytes(blob[offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def _range(self, prefix, start, end):
+        """Indices of items overlapping [start, end)"""
+        starts = self._array(f"{prefix}_start")
+        if len(starts) == 0:
+            return range(0)
+        lo = int(np.searchsorted(self._end_max(prefix), start, side='right'))
+        hi = int(np.searchsorted(starts, end, side='left'))
+        return range(lo, max(lo, hi))
+
+    def __len__(self):
+        return self.meta.get('segments', 0)
+
+    def segments_in(self, start, end):
+        """Segments overlapping a time window"""
+        starts = self._array('seg_start')
+        ends = self._array('seg_end')
+        return [
+            {'start': float(starts[i]), 'end': float(ends[i]), 'text': self._text('seg', i)}
+            for i in self._range('seg', start, end)
+            if ends[i] > start
+        ]
+
+    def words_in(self, start, end):
+        """Words overlapping a time window (empty without word timestamps)"""
+        if not self.has_words:
+            return []
+        starts = self._array('word_start')
+        ends = self._array('word_end')
+        return [
+            {'start': float(starts[i]), 'end': float(ends[i]), 'word': self._text('word', i)}
+            for i in self._range('word', start, end)
+            if ends[i] > start
+        ]
+
+    def snap_start(self, time, tolerance):
+        """Move a clip start to the nearest word/segment start within tolerance"""
+        prefix = 'word' if self.has_words else 'seg'
+        return self._snap(self._array(f"{prefix}_start"), time, tolerance)
+
+    def snap_end(self, time, tolerance):
+        """Move a clip end to the nearest word/segment end within tolerance"""
+        prefix = 'word' if self.has_words else 'seg'
+        return self._snap(self._end_max(prefix), time, tolerance)
+
+    def _snap(self, boundaries, time, tolerance):
+        if len(boundaries) == 0:
+            return time
+        idx = int(np.searchsorted(boundaries, time))
+        candidates = [boundaries[i] for i in (idx - 1, idx) if 0 <= i < len(boundaries)]
+        best = min(candidates, key=lambda b: abs(b - time))
+        return float(best) if abs(best - time) <= tolerance else time
+
+    def to_dict(self):
+        """Rebuild a Whisper-style transcript dict (loads everything)"""
+        starts = self._array('seg_start')
+        ends = self._array('seg_end')
+        segments = [
+            {'start': float(starts[i]), 'end': float(ends[i]), 'text': self._text('seg', i)}
+            for i in range(len(starts))
+        ]
+        if self.has_words:
+            word_segment = self._array('word_segment')
+            starts = self._array('word_start')
+            ends = self._array('word_end')
+            for segment in segments:
+                segment['words'] = []
+            for i in range(len(word_segment)):
+                segments[int(word_segment[i])]['words'].append({
+                    'start': float(starts[i]),
+                    'end': float(ends[i]),
+                    'word': self._text('word', i)
+                })
+        return {
+            'text': ''.join(s['text'] for s in segments),
+            'segments': segments,
+            'detected_language': self.language
+        }
@@ -0,0 +1,229 @@
+"""
+Pluggable speech-to-text backends
+
+Every backend takes 16 kHz mono float32 audio and returns segments in the
+same schema the rest of the pipeline uses:
+
+    {'start': float, 'end': float, 'text': str,
+     'words': [{'start': float, 'end': float, 'word': str}]}  # words optional
+
+Backends:
+    whisper         openai-whisper on PyTorch, fp32 (original behaviour)
+    whisper-int8    openai-whisper with Linear layers dynamically quantized to int8
+    faster-whisper  CTranslate2 engine with int8 weights (needs `faster-whisper`)
+"""
+import os
+import subprocess
+import threading
+import numpy as np
+import subprocess_runner
+
+SAMPLE_RATE = 16000
+LANGUAGE_DETECT_SECONDS = 30
+
+TRANSCRIBE_BACKEND = os.getenv('TRANSCRIBE_BACKEND', 'auto')
+CPU_THREADS = int(os.getenv('TRANSCRIBE_THREADS', '0'))  # 0 = library default
+
+# Loaded backends, shared by every processor in this process
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def load_audio(path, sample_rate=SAMPLE_RATE, timeout=None, cancel_event=None):
+    """Decode any media file to mono float32 PCM with FFmpeg"""
+    cmd = [
+        'ffmpeg',
+        '-nostdin',
+        '-threads', '0',
+        '-i', path,
+        '-f', 's16le',
+        '-ac', '1',
+        '-acodec', 'pcm_s16le',
+        '-ar', str(sample_rate),
+        '-'
+    ]
+    try:
+        out = subprocess_runner.run(cmd, check=True, timeout=timeout, cancel_event=cancel_event).stdout
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr or e}") from e
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+class TranscriptionBackend:
+    """Interface implemented by every speech-to-text engine"""
+
+    name = None
+
+    def __init__(self, model_size):
+        self.model_size = model_size
+        # Models are shared between jobs but not safe to run concurrently
+        self.lock = threading.Lock()
+
+    def detect_language(self, audio):
+        """Return (language_code, probability) for the start of the audio"""
+        raise NotImplementedError
+
+    def transcribe(self, audio, language, word_timestamps=False, initial_prompt=None):
+        """Return a list of segments with timestamps relative to the audio start"""
+        raise NotImplementedError
+
+
+class WhisperBackend(TranscriptionBackend):
+    """openai-whisper on PyTorch"""
+
+    name = 'whisper'
+
+    def __init__(self, model_size):
+        super().__init__(model_size)
+        import whisper
+        self._whisper = whisper
+        if CPU_THREADS:
+            import torch
+            torch.set_num_threads(CPU_THREADS)
+        self.model = whisper.load_model(model_size)
+
+    def detect_language(self, audio):
+        whisper = self._whisper
+        # large-v3 uses 128 mel bins, earlier models 80
+        mel = whisper.log_mel_spectrogram(
+            whisper.pad_or_trim(audio), n_mels=self.model.dims.n_mels
+        ).to(self.model.device)
+        _, probs = self.model.detect_language(mel)
+        language = max(probs, key=probs.get)
+        return language, probs[language]
+
+    def transcribe(self, audio, language, word_timestamps=False, initial_prompt=None):
+        result = self.model.transcribe(
+            audio,
+            language=language,  # Specify language for better accuracy
+            fp16=False,  # Disable FP16 for CPU
+            verbose=False,
+            task='transcribe',  # Use 'transcribe' not 'translate'
+            word_timestamps=word_timestamps,
+            condition_on_previous_text=True,  # Better context awareness
+            initial_prompt=initial_prompt
+        )
+        return [
+            {
+                'start': seg['start'],
+                'end': seg['end'],
+                'text': seg['text'],
+                'words': [
+                    {'start': w['start'], 'end': w['end'], 'word': w['word']}
+                    for w in seg.get('words') or []
+                ]
+            }
+            for seg in result['segments']
+        ]
+
+
+class QuantizedWhisperBackend(WhisperBackend):
+    """openai-whisper with int8 dynamic quantization of all Linear layers (CPU only)"""
+
+    name = 'whisper-int8'
+
+    def __init__(self, model_size):
+        super().__init__(model_size)
+        import torch
+        self.model = self.model.cpu()
+        self._replace_linear(self.model, torch.nn)
+        self.model = torch.quantization.quantize_dynamic(
+            self.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+    def _replace_linear(self, module, nn):
+        """Swap whisper's Linear subclass for plain nn.Linear so quantize_dynamic recognises it"""
+        for name, child in module.named_children():
+            if isinstance(child, nn.Linear) and type(child) is not nn.Linear:
+                plain = nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                plain.weight = child.weight
+                plain.bias = child.bias
+                setattr(module, name, plain)
+            else:
+                self._replace_linear(child, nn)
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """CTranslate2 (faster-whisper) with int8 weights"""
+
+    name = 'faster-whisper'
+
+    def __init__(self, model_size):
+        super().__init__(model_size)
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(
+            model_size,
+            device='cpu',
+            compute_type=os.getenv('FASTER_WHISPER_COMPUTE_TYPE', 'int8'),
+            cpu_threads=CPU_THREADS
+        )
+
+    def detect_language(self, audio):
+        # Language is detected eagerly; the segment generator is never consumed
+        _, info = self.model.transcribe(audio[:LANGUAGE_DETECT_SECONDS * SAMPLE_RATE])
+        return info.language, info.language_probability
+
+    def transcribe(self, audio, language, word_timestamps=False, initial_prompt=None):
+        segments, _ = self.model.transcribe(
+            audio,
+            language=language,
+            task='transcribe',
+            word_timestamps=word_timestamps,
+            condition_on_previous_text=True,
+            initial_prompt=initial_prompt
+        )
+        return [
+            {
+                'start': seg.start,
+                'end': seg.end,
+                'text': seg.text,
+                'words': [
+                    {'start': w.start, 'end': w.end, 'word': w.word}
+                    for w in seg.words or []
+                ]
+            }
+            for seg in segments
+        ]
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    QuantizedWhisperBackend.name: QuantizedWhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend
+}
+
+
+def resolve_backend_name(name=None):
+    """Turn 'auto' (or None) into the fastest backend available here"""
+    name = name or TRANSCRIBE_BACKEND
+    if name != 'auto':
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown transcription backend: {name}")
+        return name
+
+    try:
+        import faster_whisper  # noqa: F401
+        return FasterWhisperBackend.name
+    except ImportError:
+        pass
+
+    import torch
+    return WhisperBackend.name if torch.cuda.is_available() else QuantizedWhisperBackend.name
+
+
+def is_backend_loaded(name, model_size):
+    """Whether get_backend would return an already-loaded model"""
+    key = (resolve_backend_name(name), model_size)
+    with _backends_lock:
+        return key in _backends
+
+
+def get_backend(name, model_size):
+    """Return a loaded backend, loading it once per process"""
+    name = resolve_backend_name(name)
+    key = (name, model_size)
+    with _backends_lock:
+        if key not in _backends:
+            print(f"Loading {name} {model_size} model...")
+            _backends[key] = BACKENDS[name](model_size)
+    return _backends[key]
@@ -0,0 +1,122 @@
+"""
+Energy-based voice activity detection
+
+Builds a speech map (list of [start, end] seconds) from 16 kHz mono audio with
+plain NumPy frame statistics:
+
+1. Frame log-energy above an adaptive noise floor marks candidate speech.
+2. Speech has strong syllabic energy modulation; steady music beds and hum
+   don't, so windows with low energy variance are rejected.
+3. Short gaps are bridged, tiny blips dropped and regions padded.
+"""
+import os
+import json
+import bisect
+import numpy as np
+
+FRAME_SECONDS = 0.03
+MODULATION_WINDOW_SECONDS = 1.0
+ENERGY_MARGIN_DB = 10.0  # Above the noise floor
+ABSOLUTE_FLOOR_DB = -55.0  # Never treat anything quieter than this as speech
+MIN_MODULATION_DB = 3.0  # Std of frame energy within a window
+MIN_SILENCE_SECONDS = 0.5  # Shorter gaps are bridged
+MIN_SPEECH_SECONDS = 0.25  # Shorter regions are dropped
+PAD_SECONDS = 0.2
+
+
+def detect_speech(audio, sample_rate=16000):
+    """Return speech regions in seconds as a list of [start, end] pairs"""
+    frame_size = int(sample_rate * FRAME_SECONDS)
+    num_frames = len(audio) // frame_size
+    if num_frames == 0:
+        return []
+
+    frames = np.asarray(audio[:num_frames * frame_size], dtype=np.float32).reshape(num_frames, frame_size)
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+
+    # Adaptive threshold relative to the quietest 10% of frames
+    noise_floor = np.percentile(energy_db, 10)
+    threshold = max(noise_floor + ENERGY_MARGIN_DB, ABSOLUTE_FLOOR_DB)
+    active = energy_db > threshold
+
+    # Reject steady sound (music beds, hum) by low energy modulation per window
+    window = max(1, int(MODULATION_WINDOW_SECONDS / FRAME_SECONDS))
+    num_windows = -(-num_frames // window)
+    padded = np.pad(energy_db, (0, num_windows * window - num_frames), mode='edge')
+    modulation = padded.reshape(num_windows, window).std(axis=1)
+    active &= np.repeat(modulation >= MIN_MODULATION_DB, window)[:num_frames]
+
+    return _frames_to_regions(active, FRAME_SECONDS, num_frames * FRAME_SECONDS)
+
+
+def _frames_to_regions(active, frame_seconds, total_seconds):
+    """Turn a boolean frame mask into smoothed [start, end] regions"""
+    # Rising/falling edges of the mask
+    edges = np.diff(np.concatenate(([0], active.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1) * frame_seconds
+    ends = np.flatnonzero(edges == -1) * frame_seconds
+
+    regions = []
+    for start, end in zip(starts, ends):
+        if regions and start - regions[-1][1] < MIN_SILENCE_SECONDS:
+            regions[-1][1] = float(end)
+        else:
+            regions.append([float(start), float(end)])
+
+    padded = []
+    for start, end in regions:
+        if end - start < MIN_SPEECH_SECONDS:
+            continue
+        start = max(0.0, start - PAD_SECONDS)
+        end = min(total_seconds, end + PAD_SECONDS)
+        if padded and start <= padded[-1][1]:
+            padded[-1][1] = end
+        else:
+            padded.append([round(start, 3), round(end, 3)])
+    return padded
+
+
+def merge_regions(regions, max_gap):
+    """Join regions separated by less than max_gap (fewer, longer transcription spans)"""
+    merged = []
+    for start, end in regions:
+        if merged and start - merged[-1][1] < max_gap:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def speech_overlap(regions, start, end):
+    """Seconds of speech inside [start, end]"""
+    if not regions:
+        return 0.0
+    idx = max(0, bisect.bisect_right([r[0] for r in regions], start) - 1)
+    total = 0.0
+    for region_start, region_end in regions[idx:]:
+        if region_start >= end:
+            break
+        total += max(0.0, min(end, region_end) - max(start, region_start))
+    return total
+
+
+def save_speech_map(regions, total_seconds, path):
+    """Persist a speech map for later stages"""
+    speech_seconds = sum(end - start for start, end in regions)
+    data = {
+        'total_seconds': round(total_seconds, 3),
+        'speech_seconds': round(speech_seconds, 3),
+        'regions': regions
+    }
+    with open(path + '.part', 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(path + '.part', path)
+    return data
+
+
+def load_speech_map(path):
+    """Load a persisted speech map, or None if there is none"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
@@ -3,111 +3,477 @@ Video Processing Pipeline with Whisper, FFmpeg, and Gemini AI
 """
 import os
 import json
-import whisper
-import google.generativeai as genai
+import math
 import subprocess
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
+import numpy as np
 from dotenv import load_dotenv
+from transcript_store import save_transcript, load_transcript
+from subtitle_writers import TranscriptStreamWriter, VttWriter, format_timestamp, read_partial_transcript
+from vad import detect_speech, merge_regions, speech_overlap, save_speech_map, load_speech_map
+from model_policy import select_model_size
+from transcription import SAMPLE_RATE, load_audio, get_backend, is_backend_loaded, resolve_backend_name
+from metrics import JobTrace, child_usage
+from media_index import build_index, save_index, load_index
+import subprocess_runner
+from subprocess_runner import JobCancelled
 
 load_dotenv()
 
-# Configure Gemini AI
+# Gemini AI is imported and configured on first use (see get_genai)
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def get_genai():
+    """Import and configure google.generativeai once, on first use"""
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            if GEMINI_API_KEY:
+                genai.configure(api_key=GEMINI_API_KEY)
+            _genai = genai
+    return _genai
+
+
+def warm_up(model_sizes=None, backend=None):
+    """Load heavy dependencies up front (e.g. in a pre-fork master so workers share pages)"""
+    get_genai()
+    for size in model_sizes or []:
+        get_backend(backend, size)
+
+# Threads per FFmpeg encode (0 = FFmpeg decides); lowered when many jobs run at once
+FFMPEG_THREADS = int(os.getenv('FFMPEG_THREADS', '0'))
+
+# Timeouts for child processes; encodes scale with the media they read or write
+FFPROBE_TIMEOUT = int(os.getenv('FFPROBE_TIMEOUT', '60'))
+FFMPEG_MIN_TIMEOUT = int(os.getenv('FFMPEG_MIN_TIMEOUT', '300'))
+FFMPEG_TIMEOUT_FACTOR = float(os.getenv('FFMPEG_TIMEOUT_FACTOR', '10'))  # x media seconds
+
+
+def encode_timeout(media_seconds):
+    """Timeout for an FFmpeg run over `media_seconds` of media"""
+    return max(FFMPEG_MIN_TIMEOUT, float(media_seconds or 0) * FFMPEG_TIMEOUT_FACTOR)
+
+# Proxy (mezzanine) settings: 'auto' only builds a proxy for heavy sources
+# whose clips would decode more than PROXY_BREAK_EVEN x the source duration
+PROXY_MODE = os.getenv('PROXY_MODE', 'auto')  # 'auto', 'on' or 'off'
+PROXY_BREAK_EVEN = float(os.getenv('PROXY_BREAK_EVEN', '1.5'))  # The proxy decodes + encodes everything once
+PROXY_GOP = int(os.getenv('PROXY_GOP', '15'))  # Short GOP keeps seeks cheap
+
+# Codecs that are expensive to decode repeatedly on CPU
+HEAVY_CODECS = {'hevc', 'vp9', 'av1', 'prores', 'mpeg2video', 'mpeg4', 'dnxhd', 'rawvideo'}
+
+# Map requested quality to output height
+QUALITY_HEIGHTS = {
+    '2160p': 2160,
+    '1440p': 1440,
+    '1080p': 1080,
+    '720p': 720,
+    '480p': 480,
+    '360p': 360
+}
+
+# Per-clip thumbnail settings
+THUMBNAIL_BATCH = int(os.getenv('THUMBNAIL_BATCH', '16'))  # Clips per FFmpeg run
+THUMBNAIL_WINDOW = 10  # Seconds scanned when picking the best poster frame
+SPRITE_GRID = (5, 5)  # Columns x rows in a scrubbing sprite sheet
+SPRITE_TILE_WIDTH = 160
+
+# Streaming transcription: audio is transcribed and written out chunk by chunk
+STREAM_CHUNK_SECONDS = float(os.getenv('STREAM_CHUNK_SECONDS', '300'))
+CHUNK_EDGE_SECONDS = 2.0  # Segments ending this close to a chunk edge are redone
+WHISPER_WINDOW_SECONDS = 30  # Whisper pads every call to whole windows of this length
+PACK_GAP_SECONDS = 0.5  # Silence between speech regions packed into one call
+PROMPT_CONTEXT_CHARS = 200  # Previous text passed to the next chunk as a prompt
+PARTIAL_TRANSCRIPT_SEGMENTS = 5  # Recent segments exposed through progress
+
+# Voice activity detection: only speech regions are sent to Whisper
+VAD_ENABLED = os.getenv('VAD_ENABLED', 'true').lower() == 'true'
+VAD_MERGE_GAP = 2.0  # Speech regions closer than this are transcribed together
+MIN_CLIP_SPEECH_RATIO = 0.3  # Fallback planner skips windows with less speech
+
+# Max distance (seconds) a clip boundary may move to land on a word/segment edge
+WORD_SNAP_TOLERANCE = float(os.getenv('WORD_SNAP_TOLERANCE', '1.0'))
+
+# Keyframe/scene index: clip starts snap back to keyframes, ends to shot changes
+MEDIA_INDEX_ENABLED = os.getenv('MEDIA_INDEX', 'true').lower() == 'true'
+SCENE_FULL_DECODE_SECONDS = float(os.getenv('SCENE_FULL_DECODE_SECONDS', '600'))  # Longer sources score keyframes only
+KEYFRAME_SNAP_TOLERANCE = float(os.getenv('KEYFRAME_SNAP_TOLERANCE', '1.0'))
+SCENE_SNAP_WINDOW = 5.0  # Fallback clips may end this far from the target on a shot change
+SCENE_PROMPT_LIMIT = 30  # Scene changes listed in the Gemini prompt
+# Clips without burned subtitles that start on a keyframe are cut without re-encoding
+STREAM_COPY_CUTS = os.getenv('STREAM_COPY_CUTS', 'true').lower() == 'true'
+STREAM_COPY_CODECS = {'h264'}
+STREAM_COPY_AUDIO_CODECS = {'aac', 'none'}
+
 
 class VideoProcessor:
     def __init__(self, video_path, output_dir="downloads"):
         self.video_path = video_path
         self.output_dir = output_dir
         self.video_id = Path(video_path).stem
-        self.whisper_model = None
+        self.transcriber = None
+        # Decode source for clips and thumbnails (switched to the proxy when one is built)
+        self.media_path = video_path
+        self.transcript_store = None
+        self.speech_map = None
+        self.model_choice = None
+        self._media_seconds = None
+        self.media_index = None
+        # Whether clips from media_path can be stream-copied into MP4
+        self.stream_copy_ok = False
+        self.trace = JobTrace(self.video_id)
+        # Set by cancel(); checked between stages and kills running children
+        self.cancel_event = threading.Event()
+    
+    def cancel(self):
+        """Stop this job: running FFmpeg children are killed, later stages are skipped"""
+        self.cancel_event.set()
+    
+    def _check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled(f"Job {self.video_id} was cancelled")
         
-    def load_whisper_model(self, model_size="tiny"):
-        """Load Whisper model for transcription"""
-        if not self.whisper_model:
-            print(f"Loading Whisper {model_size} model...")
-            self.whisper_model = whisper.load_model(model_size)
-        return self.whisper_model
+    def load_transcriber(self, model_size="tiny", backend=None):
+        """Load a transcription backend (cached per process)"""
+        self.trace.cache('transcription_model', is_backend_loaded(backend, model_size))
+        with self.trace.stage('model_load'):
+            self.transcriber = get_backend(backend, model_size)
+        return self.transcriber
     
-    def generate_subtitles(self, language=None):
+    def generate_subtitles(self, language=None, word_timestamps=False, progress_callback=None,
+                           use_vad=VAD_ENABLED, model_size='auto', queue_depth=0, latency_budget=None,
+                           backend=None):
         """Generate subtitles using Whisper with language detection"""
         print("Generating subtitles with Whisper...")
         
+        subtitle_path = os.path.join(self.output_dir, f"{self.video_id}.vtt")
+        json_path = os.path.join(self.output_dir, f"{self.video_id}_transcript.json")
+        writer = None
+        segments = []
+        
         try:
-            model = self.load_whisper_model()
+            with self.trace.stage('audio_decode'):
+                audio = load_audio(self.video_path, timeout=encode_timeout(self.media_seconds()),
+                                   cancel_event=self.cancel_event)
+            sample_rate = SAMPLE_RATE
+            total_seconds = len(audio) / sample_rate
+            
+            # Skip silence and music: only speech regions are transcribed
+            if use_vad:
+                self.build_speech_map(audio, sample_rate)
+                spans = merge_regions(self.speech_map['regions'], VAD_MERGE_GAP)
+            else:
+                spans = [[0.0, total_seconds]]
+            
+            # Resume after the segments an interrupted run already committed
+            recovered = self._recover_transcript(json_path, language, word_timestamps)
+            if recovered:
+                language, segments = recovered
+                resume_at = segments[-1]['end']
+                spans = [[max(start, resume_at), end] for start, end in spans if end > resume_at]
+                print(f"Resuming transcription at {resume_at:.1f}s ({len(segments)} segments recovered)")
+            
+            # Short speech regions share Whisper calls instead of each being padded to 30 s
+            packs = self._pack_spans(spans)
+            
+            # Pick the model from the audio Whisper will actually process and current load
+            backend = resolve_backend_name(backend)
+            self.model_choice = select_model_size(
+                self._packed_seconds(packs),
+                queue_depth=queue_depth,
+                latency_budget=latency_budget,
+                requested=model_size,
+                backend=backend
+            )
+            print(f"Whisper model: {self.model_choice['model']} on {backend} ({self.model_choice['reason']}, "
+                  f"~{self.model_choice['estimated_seconds']}s)")
+            transcriber = self.load_transcriber(self.model_choice['model'], backend)
             
             # First, detect the language if not specified
             if not language:
                 print("Detecting language...")
-                audio = whisper.load_audio(self.video_path)
-                audio = whisper.pad_or_trim(audio)
-                mel = whisper.log_mel_spectrogram(audio).to(model.device)
-                _, probs = model.detect_language(mel)
-                detected_language = max(probs, key=probs.get)
-                print(f"Detected language: {detected_language} (confidence: {probs[detected_language]:.2%})")
+                # Listen from the first speech onset rather than a music intro
+                first_speech = int(spans[0][0] * sample_rate) if spans else 0
+                with self.trace.stage('language_detection'), self._acquire(transcriber.lock):
+                    detected_language, confidence = transcriber.detect_language(audio[first_speech:])
+                print(f"Detected language: {detected_language} (confidence: {confidence:.2%})")
                 language = detected_language
             
             # Transcribe with specified language for better accuracy
             print(f"Transcribing video in {language}: {self.video_path}")
-            result = model.transcribe(
-                self.video_path,
-                language=language,  # Specify language for better accuracy
-                fp16=False,  # Disable FP16 for CPU
-                verbose=False,
-                task='transcribe',  # Use 'transcribe' not 'translate'
-                word_timestamps=False,  # Disable for faster processing
-                condition_on_previous_text=True  # Better context awareness
+            writer = TranscriptStreamWriter(
+                subtitle_path,
+                os.path.join(self.output_dir, f"{self.video_id}.srt"),
+                json_path,
+                language=language
             )
+            for segment in segments:
+                writer.write_segment(segment)
             
-            # Add detected language to result
-            result['detected_language'] = language
-            
-            # Save as VTT format
-            subtitle_path = os.path.join(self.output_dir, f"{self.video_id}.vtt")
-            self._save_vtt(result, subtitle_path)
-            
-            # Save as JSON for easier processing
-            json_path = os.path.join(self.output_dir, f"{self.video_id}_transcript.json")
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2, ensure_ascii=False)
+            previous_text = ''.join(s['text'] for s in segments)[-PROMPT_CONTEXT_CHARS:]
+            with self.trace.stage('whisper'):
+                for segment in self._transcribe_stream(transcriber, audio, language, word_timestamps, packs,
+                                                       previous_text):
+                    segments.append(segment)
+                    writer.write_segment(segment)
+                
+                    if progress_callback:
+                        writer.flush()
+                        progress_callback(
+                            min(segment['end'] / total_seconds, 1.0) if total_seconds else 1.0,
+                            {
+                                'segments': len(segments),
+                                'transcribedSeconds': round(segment['end'], 1),
+                                'recentText': ' '.join(s['text'].strip() for s in segments[-PARTIAL_TRANSCRIPT_SEGMENTS:])
+                            }
+                        )
             
+            result = self._finish_transcript(writer, segments, language)
             print(f"Subtitles saved to {subtitle_path} (Language: {language})")
             return subtitle_path, result
             
+        except JobCancelled:
+            if writer:
+                writer.abort()
+            raise
         except Exception as e:
             print(f"Whisper transcription error: {e}")
+            # Keep what was transcribed before the failure
+            if writer and segments:
+                result = self._finish_transcript(writer, segments, language)
+                print(f"Saved partial subtitles ({len(segments)} segments, up to "
+                      f"{segments[-1]['end']:.1f}s) to {subtitle_path}")
+                return subtitle_path, result
+            
             print("Creating empty subtitle file as fallback...")
+            if writer:
+                writer.abort()
             
             # Create empty subtitle file
-            subtitle_path = os.path.join(self.output_dir, f"{self.video_id}.vtt")
-            with open(subtitle_path, 'w', encoding='utf-8') as f:
-                f.write("WEBVTT\n\n")
+            self._save_vtt({'segments': []}, subtitle_path)
             
             # Return empty result
             return subtitle_path, {'text': '', 'segments': [], 'detected_language': 'unknown'}
     
+    def _finish_transcript(self, writer, segments, language):
+        """Close the streamed outputs and build the columnar store from the segments"""
+        result = {
+            'text': ''.join(s['text'] for s in segments),
+            'segments': segments,
+            'detected_language': language
+        }
+        writer.close(text=result['text'])
+        
+        # Columnar copy for windowed reads (clip subtitles, boundary snapping)
+        store_dir = os.path.join(self.output_dir, f"{self.video_id}_transcript")
+        with self.trace.stage('transcript_store'):
+            save_transcript(result, store_dir)
+        self.transcript_store = load_transcript(store_dir)
+        return result
+    
+    def _recover_transcript(self, json_path, language, word_timestamps):
+        """(language, segments) left in the transcript .part by an interrupted run, if reusable"""
+        if not os.path.exists(json_path + '.part') or \
+                os.path.getmtime(json_path + '.part') < os.path.getmtime(self.video_path):
+            return None
+        recovered = read_partial_transcript(json_path)
+        if not recovered or not recovered[1]:
+            return None
+        recovered_language, segments = recovered
+        if language and language != recovered_language:
+            return None
+        if word_timestamps and not any(s.get('words') for s in segments):
+            return None
+        return recovered_language, segments
+    
+    def build_speech_map(self, audio, sample_rate):
+        """Run (or reuse) the VAD pass and persist the speech map for later stages"""
+        speech_map_path = os.path.join(self.output_dir, f"{self.video_id}_speech.json")
+        cached = load_speech_map(speech_map_path)
+        hit = bool(cached) and os.path.getmtime(speech_map_path) >= os.path.getmtime(self.video_path)
+        self.trace.cache('speech_map', hit)
+        if hit:
+            self.speech_map = cached
+        else:
+            with self.trace.stage('vad'):
+                regions = detect_speech(audio, sample_rate)
+            self.speech_map = save_speech_map(regions, len(audio) / sample_rate, speech_map_path)
+        
+        total = self.speech_map['total_seconds']
+        speech = self.speech_map['speech_seconds']
+        print(f"Speech map: {speech:.1f}s of speech in {total:.1f}s "
+              f"({speech / total:.0%} sent to Whisper)" if total else "Speech map: no audio")
+        return self.speech_map
+    
+    @contextmanager
+    def _acquire(self, lock):
+        """Hold a shared lock, counting the time spent waiting as queue wait"""
+        started = time.perf_counter()
+        with lock:
+            self.trace.queue_wait(time.perf_counter() - started)
+            yield
+    
+    def _pack_spans(self, spans):
+        """Group consecutive spans into buffers of at most STREAM_CHUNK_SECONDS (longer spans stay alone)"""
+        packs = []
+        current = []
+        length = 0.0
+        for start, end in spans:
+            if current and length + PACK_GAP_SECONDS + (end - start) > STREAM_CHUNK_SECONDS:
+                packs.append(current)
+                current = []
+                length = 0.0
+            if current:
+                length += PACK_GAP_SECONDS
+            current.append([start, end])
+            length += end - start
+        if current:
+            packs.append(current)
+        return packs
+    
+    def _packed_seconds(self, packs):
+        """Audio Whisper will process for these packs, including the padding of each call"""
+        total = 0.0
+        for pack in packs:
+            length = sum(end - start for start, end in pack) + PACK_GAP_SECONDS * (len(pack) - 1)
+            total += math.ceil(length / WHISPER_WINDOW_SECONDS) * WHISPER_WINDOW_SECONDS
+        return total
+    
+    def _transcribe_stream(self, transcriber, audio, language, word_timestamps, packs, previous_text=''):
+        """Transcribe packs of spans, yielding segments with absolute timestamps as they finish"""
+        for pack in packs:
+            if len(pack) == 1:
+                span_start, span_end = pack[0]
+                segments = self._transcribe_span(transcriber, audio, language, word_timestamps,
+                                                 span_start, span_end, previous_text)
+            else:
+                segments = self._transcribe_pack(transcriber, audio, language, word_timestamps,
+                                                 pack, previous_text)
+            for segment in segments:
+                previous_text = (previous_text + segment['text'])[-PROMPT_CONTEXT_CHARS:]
+                yield segment
+    
+    def _transcribe_pack(self, transcriber, audio, language, word_timestamps, pack, previous_text):
+        """Transcribe several short spans as one buffer, mapping timestamps back to the source"""
+        self._check_cancelled()
+        sample_rate = SAMPLE_RATE
+        gap = np.zeros(int(PACK_GAP_SECONDS * sample_rate), dtype=audio.dtype)
+        
+        # Offset map: where each span starts and ends in the packed buffer
+        pieces = []
+        packed_starts = []
+        packed_ends = []
+        position = 0.0
+        for start, end in pack:
+            if pieces:
+                pieces.append(gap)
+                position += len(gap) / sample_rate
+            piece = audio[int(start * sample_rate):int(end * sample_rate)]
+            pieces.append(piece)
+            packed_starts.append(position)
+            position += len(piece) / sample_rate
+            packed_ends.append(position)
+        
+        def to_source(time, is_end):
+            # Times in a gap belong to the following span for starts, the previous one for ends
+            if is_end:
+                i = max(int(np.searchsorted(packed_starts, time, side='left')) - 1, 0)
+            else:
+                i = min(int(np.searchsorted(packed_ends, time, side='right')), len(pack) - 1)
+            start, end = pack[i]
+            return min(max(start + time - packed_starts[i], start), end)
+        
+        with self._acquire(transcriber.lock):
+            packed_segments = transcriber.transcribe(
+                np.concatenate(pieces),
+                language,
+                word_timestamps=word_timestamps,
+                initial_prompt=previous_text[-PROMPT_CONTEXT_CHARS:] or None
+            )
+        
+        for segment in packed_segments:
+            segment = self._slim_segment(segment)
+            segment['start'] = to_source(segment['start'], False)
+            segment['end'] = max(to_source(segment['end'], True), segment['start'])
+            for word in segment.get('words', []):
+                word['start'] = to_source(word['start'], False)
+                word['end'] = max(to_source(word['end'], True), word['start'])
+            yield segment
+    
+    def _transcribe_span(self, transcriber, audio, language, word_timestamps, span_start, span_end, previous_text):
+        """Transcribe one span, STREAM_CHUNK_SECONDS at a time"""
+        sample_rate = SAMPLE_RATE
+        chunk_start = span_start
+        
+        while chunk_start < span_end:
+            self._check_cancelled()
+            chunk_end = min(chunk_start + STREAM_CHUNK_SECONDS, span_end)
+            is_last = chunk_end >= span_end
+            
+            with self._acquire(transcriber.lock):
+                chunk_segments = transcriber.transcribe(
+                    audio[int(chunk_start * sample_rate):int(chunk_end * sample_rate)],
+                    language,  # Specify language for better accuracy
+                    word_timestamps=word_timestamps,  # Opt-in: slower, but enables word snapping
+                    initial_prompt=previous_text[-PROMPT_CONTEXT_CHARS:] or None  # Carry context across chunks
+                )
+            
+            # Segments touching the chunk edge may be cut mid-word: re-transcribe
+            # them as part of the next chunk instead of committing them now
+            committed_end = chunk_start
+            held_start = None
+            for segment in chunk_segments:
+                segment = self._slim_segment(segment, offset=chunk_start)
+                if not is_last and segment['end'] > chunk_end - CHUNK_EDGE_SECONDS:
+                    held_start = segment['start']
+                    break
+                committed_end = segment['end']
+                previous_text += segment['text']
+                yield segment
+            
+            if is_last:
+                break
+            # Resume where the held-back speech starts, always making progress
+            if committed_end > chunk_start:
+                chunk_start = committed_end
+            elif held_start is not None and held_start > chunk_start:
+                chunk_start = held_start
+            elif chunk_end - CHUNK_EDGE_SECONDS > chunk_start:
+                chunk_start = chunk_end - CHUNK_EDGE_SECONDS
+            else:
+                chunk_start = chunk_end
+    
+    def _slim_segment(self, segment, offset=0.0):
+        """Reduce a Whisper segment to timing and text (plus words when present)"""
+        slim = {
+            'start': segment['start'] + offset,
+            'end': segment['end'] + offset,
+            'text': segment['text']
+        }
+        if segment.get('words'):
+            slim['words'] = [
+                {'start': w['start'] + offset, 'end': w['end'] + offset, 'word': w['word']}
+                for w in segment['words']
+            ]
+        return slim
+    
     def _save_vtt(self, transcription, output_path):
         """Convert Whisper output to VTT format"""
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write("WEBVTT\n\n")
-            
-            for i, segment in enumerate(transcription['segments']):
-                start = self._format_timestamp(segment['start'])
-                end = self._format_timestamp(segment['end'])
-                text = segment['text'].strip()
-                
-                f.write(f"{i + 1}\n")
-                f.write(f"{start} --> {end}\n")
-                f.write(f"{text}\n\n")
+        writer = VttWriter(output_path)
+        for segment in transcription['segments']:
+            writer.write_segment(segment)
+        writer.close()
     
     def _format_timestamp(self, seconds):
         """Format seconds to VTT timestamp (HH:MM:SS.mmm)"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        millis = int((seconds % 1) * 1000)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+        return format_timestamp(seconds)
     
     def analyze_with_ai(self, transcript, options=None):
         """Analyze video transcript with Gemini AI to find viral moments"""
@@ -133,7 +499,13 @@ class VideoProcessor:
             # Use the model specified in environment or default
             model_name = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
             print(f"Attempting to use Gemini model: {model_name}")
-            model = genai.GenerativeModel(model_name)
+            model = get_genai().GenerativeModel(model_name)
+            
+            scene_hint = ''
+            if self.media_index is not None and len(self.media_index.scene_cuts()):
+                scene_hint = (f"\nScene changes as [seconds, strength]:\n"
+                              f"{json.dumps(self.media_index.top_cuts(SCENE_PROMPT_LIMIT))}\n"
+                              f"Prefer clip boundaries on or near scene changes.\n")
             
             prompt = f"""
 Analyze this video transcript and identify the top {num_clips} most viral-worthy moments for short-form content.
@@ -150,7 +522,7 @@ For each moment, provide:
 
 Transcript:
 {json.dumps(transcript['segments'][:50], indent=2)}
-
+{scene_hint}
 Respond in JSON format:
 {{
   "clips": [
@@ -286,7 +658,15 @@ Respond in JSON format:
         
         else:
             # Default AI mode - create clips from start
-            start_time = float(options.get('start_time') or 0)
+            speech_regions = self.speech_map['regions'] if self.speech_map else None
+            
+            # Without an explicit start, begin at the first speech instead of an intro
+            if options.get('start_time') is not None:
+                start_time = float(options['start_time'])
+            elif speech_regions:
+                start_time = speech_regions[0][0]
+            else:
+                start_time = 0.0
             end_time = float(options.get('end_time') or duration)
             
             print(f"AI mode (fallback): Processing from {start_time}s to {end_time}s")
@@ -296,6 +676,18 @@ Respond in JSON format:
             
             while current_time < end_time and clip_count < num_clips:
                 clip_end = min(current_time + clip_duration, end_time)
+                # End on a nearby shot change rather than mid-shot
+                if self.media_index is not None and clip_end < end_time:
+                    cut = self.media_index.nearest_cut(clip_end, min(SCENE_SNAP_WINDOW, clip_duration / 2))
+                    # Never shorten below the minimum clip length (or stop advancing)
+                    if cut > current_time + 10.0:
+                        clip_end = min(cut, end_time)
+                
+                # Skip windows that are mostly silence or music
+                if speech_regions and speech_overlap(speech_regions, current_time, clip_end) < \
+                        MIN_CLIP_SPEECH_RATIO * (clip_end - current_time):
+                    current_time = clip_end
+                    continue
                 
                 if clip_end - current_time >= 10.0:  # Minimum 10 seconds
                     clips.append({
@@ -313,17 +705,52 @@ Respond in JSON format:
         print(f"Generated {len(clips)} clips")
         return {"clips": clips}
     
-    def create_clip(self, start_time, end_time, output_path, add_subtitles=True, subtitle_path=None):
-        """Create a video clip using FFmpeg"""
+    def _run_command(self, cmd, name, timeout, check=True, text=False, duration=None, progress_callback=None):
+        """Run an external tool (cancellable, with a timeout), recording its cost in the job trace"""
+        with self.trace.subprocess(name) as record:
+            return subprocess_runner.run(
+                cmd,
+                check=check,
+                text=text,
+                timeout=timeout,
+                cancel_event=self.cancel_event,
+                progress_callback=progress_callback,
+                duration=duration,
+                on_wait=self.trace.queue_wait,
+                on_exit=lambda rusage: record.update(child_usage(rusage))
+            )
+    
+    def media_seconds(self):
+        """Duration of the source, probed once (0 when unknown)"""
+        if self._media_seconds is None:
+            self._media_seconds = self.get_video_info()['duration']
+        return self._media_seconds
+    
+    def create_clip(self, start_time, end_time, output_path, add_subtitles=True, subtitle_path=None,
+                    progress_callback=None):
+        """Create a video clip using FFmpeg; progress_callback(fraction) follows the encode"""
         print(f"Creating clip: {start_time}s to {end_time}s...")
         
         duration = end_time - start_time
         
+        # With a transcript store we burn a per-clip subtitle slice, which lets us
+        # seek on the input side; the full-video VTT needs source timestamps
+        clip_subtitle_path = None
+        if add_subtitles and subtitle_path and self.transcript_store is not None:
+            clip_subtitle_path = os.path.splitext(output_path)[0] + '.vtt'
+            self._save_clip_vtt(start_time, end_time, clip_subtitle_path)
+            subtitle_path = clip_subtitle_path
+        
+        burn_subtitles = bool(add_subtitles and subtitle_path and os.path.exists(subtitle_path))
+        if not burn_subtitles and self._can_stream_copy(start_time):
+            return self._copy_clip(start_time, duration, output_path)
+        
         # Build FFmpeg command
-        cmd = [
-            'ffmpeg',
-            '-i', self.video_path,
-            '-ss', str(start_time),
+        if clip_subtitle_path or not add_subtitles or not subtitle_path:
+            cmd = ['ffmpeg', '-ss', str(start_time), '-i', self.media_path]
+        else:
+            cmd = ['ffmpeg', '-i', self.media_path, '-ss', str(start_time)]
+        cmd += [
             '-t', str(duration),
             '-c:v', 'libx264',
             '-c:a', 'aac',
@@ -331,9 +758,11 @@ Respond in JSON format:
             '-crf', '23',
             '-y'  # Overwrite output file
         ]
+        if FFMPEG_THREADS:
+            cmd.extend(['-threads', str(FFMPEG_THREADS)])
         
         # Add subtitles if available
-        if add_subtitles and subtitle_path and os.path.exists(subtitle_path):
+        if burn_subtitles:
             # Fix path for Windows - use forward slashes or escape backslashes
             subtitle_path_fixed = subtitle_path.replace('\\', '/')
             cmd.extend(['-vf', f"subtitles={subtitle_path_fixed}"])
@@ -341,21 +770,117 @@ Respond in JSON format:
         cmd.append(output_path)
         
         try:
-            subprocess.run(cmd, check=True, capture_output=True)
+            self._run_command(cmd, 'ffmpeg_clip', timeout=encode_timeout(duration),
+                              duration=duration, progress_callback=progress_callback)
             print(f"Clip saved to {output_path}")
             return True
+        except subprocess.TimeoutExpired as e:
+            print(f"FFmpeg timed out after {e.timeout:.0f}s: {output_path}")
+            return False
         except subprocess.CalledProcessError as e:
-            print(f"FFmpeg error: {e.stderr.decode()}")
+            print(f"FFmpeg error: {e.stderr}")
             return False
     
+    def _can_stream_copy(self, start_time):
+        """Clips starting exactly on a keyframe of an MP4-friendly original (never the proxy) skip re-encoding"""
+        return (STREAM_COPY_CUTS and self.stream_copy_ok and self.media_path == self.video_path and
+                self.media_index is not None and self.media_index.is_keyframe(float(start_time)))
+    
+    def _copy_clip(self, start_time, duration, output_path):
+        """Cut a clip by copying packets; exact because the start is a keyframe"""
+        cmd = [
+            'ffmpeg',
+            '-ss', str(start_time),
+            '-i', self.media_path,
+            '-t', str(duration),
+            '-map', '0:v:0',
+            '-map', '0:a:0?',
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            '-movflags', '+faststart',
+            '-y',
+            output_path
+        ]
+        try:
+            self._run_command(cmd, 'ffmpeg_clip_copy', timeout=FFMPEG_MIN_TIMEOUT)
+            print(f"Clip saved to {output_path} (stream copy)")
+            return True
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            print(f"FFmpeg stream copy error: {e.stderr or e}")
+            return False
+    
+    def _save_clip_vtt(self, start_time, end_time, output_path):
+        """Write the subtitles of one clip window, shifted to start at zero"""
+        segments = []
+        for segment in self.transcript_store.segments_in(start_time, end_time):
+            segments.append({
+                'start': max(segment['start'], start_time) - start_time,
+                'end': min(segment['end'], end_time) - start_time,
+                'text': segment['text']
+            })
+        self._save_vtt({'segments': segments}, output_path)
+    
+    def snap_clips_to_transcript(self, clips, tolerance=WORD_SNAP_TOLERANCE):
+        """Nudge clip boundaries onto word (or segment) edges so cuts don't split speech"""
+        if self.transcript_store is None:
+            return clips
+        
+        for clip in clips:
+            start = self.transcript_store.snap_start(float(clip['start_time']), tolerance)
+            end = self.transcript_store.snap_end(float(clip['end_time']), tolerance)
+            if end - start >= 1.0:
+                clip['start_time'] = start
+                clip['end_time'] = end
+        return clips
+    
+    def build_media_index(self):
+        """Load (or build and cache) the keyframe and scene-change index of media_path"""
+        index_path = os.path.join(self.output_dir, f"{Path(self.media_path).stem}_index.npz")
+        cached = load_index(index_path)
+        hit = cached is not None and os.path.getmtime(index_path) >= os.path.getmtime(self.media_path)
+        self.trace.cache('media_index', hit)
+        if hit:
+            self.media_index = cached
+        else:
+            def run(cmd, name):
+                return self._run_command(cmd, name, timeout=encode_timeout(self.media_seconds()), text=True)
+            
+            # Decode every frame only when it is cheap: a proxy or a short source
+            keyframes_only = self.media_path == self.video_path and \
+                self.media_seconds() > SCENE_FULL_DECODE_SECONDS
+            try:
+                self.media_index = build_index(self.media_path, run, keyframes_only)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+                print(f"Media index error: {e.stderr or e}")
+                return None
+            save_index(self.media_index, index_path)
+        
+        print(f"Media index: {len(self.media_index.keyframes)} keyframes, "
+              f"{len(self.media_index.scene_cuts())} scene changes")
+        return self.media_index
+    
+    def snap_clips_to_keyframes(self, clips, tolerance=KEYFRAME_SNAP_TOLERANCE):
+        """Move clip starts back onto keyframes and ends onto nearby shot changes"""
+        if self.media_index is None:
+            return clips
+        
+        for clip in clips:
+            start = self.media_index.keyframe_before(float(clip['start_time']), tolerance)
+            end = self.media_index.nearest_cut(float(clip['end_time']), tolerance)
+            if end - start >= 1.0:
+                clip['start_time'] = start
+                clip['end_time'] = end
+        return clips
+    
     def generate_thumbnail(self, time_offset=5):
         """Generate thumbnail from video at specific time"""
         thumbnail_path = os.path.join(self.output_dir, f"{self.video_id}_thumb.jpg")
         
+        # Seek on the input side so ffmpeg jumps to the nearest keyframe
         cmd = [
             'ffmpeg',
-            '-i', self.video_path,
             '-ss', str(time_offset),
+            '-i', self.media_path,
             '-vframes', '1',
             '-q:v', '2',
             '-y',
@@ -363,13 +888,136 @@ Respond in JSON format:
         ]
         
         try:
-            subprocess.run(cmd, check=True, capture_output=True)
+            self._run_command(cmd, 'ffmpeg_thumbnail', timeout=FFMPEG_MIN_TIMEOUT)
             print(f"Thumbnail saved to {thumbnail_path}")
             return thumbnail_path
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
             print(f"Thumbnail generation error: {e}")
             return None
     
+    def generate_clip_thumbnails(self, clips, mode='fast', sprite=False):
+        """Generate a poster (and optional sprite sheet) for every clip in batched FFmpeg runs"""
+        pending = []
+        for clip in clips:
+            base = os.path.splitext(clip['file_path'])[0]
+            clip['thumbnail_path'] = f"{base}_thumb.jpg"
+            if sprite:
+                clip['sprite'] = self._sprite_layout(clip['duration'])
+                clip['sprite']['path'] = f"{base}_sprite.jpg"
+            
+            # Cached outputs are valid while they were extracted from the same
+            # source window with the same settings (clips are re-cut every run)
+            outputs = [clip['thumbnail_path']] + ([clip['sprite']['path']] if sprite else [])
+            clip['_thumbnail_key'] = self._thumbnail_key(clip, mode, sprite)
+            if all(os.path.exists(p) for p in outputs) and \
+                    self._read_thumbnail_key(clip) == clip['_thumbnail_key']:
+                self.trace.cache('clip_thumbnails', True)
+                del clip['_thumbnail_key']
+                continue
+            self.trace.cache('clip_thumbnails', False)
+            pending.append(clip)
+        
+        print(f"Clip thumbnails: {len(clips) - len(pending)} cached, {len(pending)} to generate")
+        
+        for i in range(0, len(pending), THUMBNAIL_BATCH):
+            batch = pending[i:i + THUMBNAIL_BATCH]
+            success = self._run_thumbnail_batch(batch, mode, sprite)
+            for clip in batch:
+                key = clip.pop('_thumbnail_key')
+                if success:
+                    self._write_thumbnail_key(clip, key)
+                else:
+                    # Leave paths unset for clips whose thumbnails failed
+                    clip['thumbnail_path'] = None
+                    clip.pop('sprite', None)
+        
+        return clips
+    
+    def _thumbnail_key(self, clip, mode, sprite):
+        """What a clip's poster/sprite depend on"""
+        return {
+            'source': os.path.basename(self.media_path),
+            'source_mtime': os.path.getmtime(self.media_path),
+            'start': float(clip['start_time']),
+            'end': float(clip['end_time']),
+            'mode': mode,
+            'sprite': bool(sprite)
+        }
+    
+    def _thumbnail_key_path(self, clip):
+        return os.path.splitext(clip['file_path'])[0] + '_thumb.json'
+    
+    def _read_thumbnail_key(self, clip):
+        try:
+            with open(self._thumbnail_key_path(clip), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_thumbnail_key(self, clip, key):
+        path = self._thumbnail_key_path(clip)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(key, f)
+        os.replace(path + '.tmp', path)
+    
+    def _sprite_layout(self, duration):
+        """Spread sprite tiles evenly across the clip"""
+        columns, rows = SPRITE_GRID
+        interval = max(1.0, float(duration) / (columns * rows))
+        return {'columns': columns, 'rows': rows, 'interval': round(interval, 3)}
+    
+    def _run_thumbnail_batch(self, clips, mode, sprite):
+        """Extract posters/sprites for several clips with a single FFmpeg process"""
+        cmd = ['ffmpeg']
+        filters = []
+        outputs = []
+        
+        for idx, clip in enumerate(clips):
+            duration = float(clip['duration'])
+            # One input per clip, seeked on the input side and bounded to the clip window
+            cmd.extend(['-ss', str(clip['start_time']), '-t', str(duration), '-i', self.media_path])
+            
+            if mode == 'best':
+                # Pick the most representative frame within the first few seconds
+                window = min(duration, THUMBNAIL_WINDOW)
+                poster = (f"trim=duration={window},fps=2,"
+                          f"scale=-2:'min(720,ih)',thumbnail={max(1, int(window * 2))}")
+            else:
+                # First frame after a short offset to skip fades and black frames
+                offset = min(1.0, duration / 2)
+                poster = f"trim=start={offset},setpts=PTS-STARTPTS,scale=-2:'min(720,ih)'"
+            
+            if sprite:
+                layout = clip['sprite']
+                filters.append(f"[{idx}:v]split=2[src{idx}][spr{idx}]")
+                filters.append(f"[src{idx}]{poster}[poster{idx}]")
+                filters.append(
+                    f"[spr{idx}]fps=1/{layout['interval']},scale={SPRITE_TILE_WIDTH}:-2,"
+                    f"tile={layout['columns']}x{layout['rows']}[sheet{idx}]"
+                )
+                outputs.extend(['-map', f"[sheet{idx}]", '-frames:v', '1', '-q:v', '3',
+                                '-y', clip['sprite']['path']])
+            else:
+                filters.append(f"[{idx}:v]{poster}[poster{idx}]")
+            
+            outputs.extend(['-map', f"[poster{idx}]", '-frames:v', '1', '-q:v', '2',
+                            '-y', clip['thumbnail_path']])
+        
+        cmd.extend(['-filter_complex', ';'.join(filters)])
+        cmd.extend(outputs)
+        
+        try:
+            self._run_command(cmd, 'ffmpeg_clip_thumbnails',
+                              timeout=encode_timeout(sum(float(c['duration']) for c in clips)))
+            print(f"Generated thumbnails for {len(clips)} clips")
+            return True
+        except subprocess.TimeoutExpired as e:
+            print(f"Clip thumbnail generation timed out after {e.timeout:.0f}s")
+            return False
+        except subprocess.CalledProcessError as e:
+            print(f"Clip thumbnail generation error: {e.stderr}")
+            return False
+    
     def get_video_info(self):
         """Get video metadata using FFprobe"""
         cmd = [
@@ -382,20 +1030,130 @@ Respond in JSON format:
         ]
         
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = self._run_command(cmd, 'ffprobe', timeout=FFPROBE_TIMEOUT, text=True)
             info = json.loads(result.stdout)
             
             duration = float(info['format'].get('duration', 0))
             size = int(info['format'].get('size', 0))
             
+            # First video stream carries resolution and codec
+            video_stream = next(
+                (s for s in info.get('streams', []) if s.get('codec_type') == 'video'),
+                {}
+            )
+            audio_stream = next(
+                (s for s in info.get('streams', []) if s.get('codec_type') == 'audio'),
+                {}
+            )
+            
             return {
                 'duration': int(duration),
                 'file_size': size,
-                'format': info['format'].get('format_name', 'unknown')
+                'format': info['format'].get('format_name', 'unknown'),
+                'width': int(video_stream.get('width', 0)),
+                'height': int(video_stream.get('height', 0)),
+                'video_codec': video_stream.get('codec_name', 'unknown'),
+                'audio_codec': audio_stream.get('codec_name', 'none')
             }
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"Error getting video info: {e}")
-            return {'duration': 0, 'file_size': 0, 'format': 'unknown'}
+            return {'duration': 0, 'file_size': 0, 'format': 'unknown',
+                    'width': 0, 'height': 0, 'video_codec': 'unknown', 'audio_codec': 'unknown'}
+    
+    def _should_use_proxy(self, video_info, options):
+        """Decide whether a proxy is worth building for this job"""
+        mode = options.get('use_proxy')
+        if mode is None:
+            mode = PROXY_MODE
+        if mode in (True, 'on'):
+            return True
+        if mode in (False, 'off'):
+            return False
+        
+        # 'auto': only heavy sources, and only when the clips would decode
+        # more of the source than transcoding it once costs
+        requested_height = QUALITY_HEIGHTS.get(options.get('quality'))
+        heavy = (
+            video_info.get('video_codec') in HEAVY_CODECS or
+            (requested_height is not None and video_info.get('height', 0) > requested_height)
+        )
+        source_seconds = float(video_info.get('duration') or 0)
+        if not heavy or not source_seconds:
+            return False
+        return self._clip_decode_seconds(source_seconds, options) > source_seconds * PROXY_BREAK_EVEN
+    
+    def _clip_decode_seconds(self, source_seconds, options):
+        """Source seconds the clip and thumbnail passes would decode without a proxy"""
+        start = float(options.get('start_time') or 0)
+        end = float(options.get('end_time') or source_seconds)
+        window = max(0.0, min(end, source_seconds) - start)
+        num_clips = options.get('num_clips', 5)
+        clip_seconds = float(options.get('clip_duration') or 45)
+        # num_clips 0 means 'as many as fit' (divide mode)
+        total = window if num_clips == 0 else min(window, (num_clips or 0) * clip_seconds)
+        passes = 2 if options.get('clip_thumbnails', True) else 1  # Clip encode + poster/sprite batch
+        return total * passes
+    
+    def _proxy_height(self, video_info, options):
+        """Height of the proxy: the requested quality if any, never above the source"""
+        source_height = video_info.get('height') or None
+        requested_height = QUALITY_HEIGHTS.get(options.get('quality'))
+        if requested_height and source_height:
+            return min(requested_height, source_height)
+        return requested_height or source_height
+    
+    def create_proxy(self, height=None, progress_callback=None):
+        """Transcode the source once into a cached, fast-seeking intermediate (source height if None)"""
+        label = f"{height}p" if height else 'source'
+        proxy_path = os.path.join(self.output_dir, f"{self.video_id}_proxy_{label}.mp4")
+        
+        # Reuse a proxy from a previous run unless the source changed since
+        hit = (os.path.exists(proxy_path) and
+               os.path.getmtime(proxy_path) >= os.path.getmtime(self.video_path))
+        self.trace.cache('proxy', hit)
+        if hit:
+            print(f"Reusing cached proxy: {proxy_path}")
+            return proxy_path
+        
+        print(f"Creating {height}p proxy for {self.video_path}...")
+        temp_path = proxy_path + '.tmp.mp4'
+        cmd = [
+            'ffmpeg',
+            '-i', self.video_path,
+            '-map', '0:v:0',
+            '-map', '0:a:0?',
+            '-vf', f"scale=-2:'min({height},ih)'" if height else 'null',
+            '-c:v', 'libx264',
+            '-preset', 'veryfast',
+            '-tune', 'fastdecode',
+            '-crf', '18',
+            '-g', str(PROXY_GOP),
+            '-keyint_min', str(PROXY_GOP),
+            '-sc_threshold', '0',
+            '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac',
+            '-b:a', '160k',
+            '-movflags', '+faststart',
+            '-threads', str(FFMPEG_THREADS),
+            '-y',
+            temp_path
+        ]
+        
+        try:
+            duration = self.media_seconds()
+            self._run_command(cmd, 'ffmpeg_proxy', timeout=encode_timeout(duration),
+                              duration=duration, progress_callback=progress_callback)
+            os.replace(temp_path, proxy_path)
+            print(f"Proxy saved to {proxy_path}")
+            return proxy_path
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            print(f"Proxy creation error: {e.stderr or e}")
+            return None
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
     
     def process_full_pipeline(self, skip_subtitles=False, options=None, progress_callback=None):
         """Run the complete processing pipeline with progress tracking"""
@@ -409,6 +1167,7 @@ Respond in JSON format:
         end_time = options.get('end_time')
         emotion_filter = options.get('emotions', [])
         subtitle_language = options.get('subtitle_language')  # Optional language specification
+        word_timestamps = options.get('word_timestamps', False)
         
         print(f"\n{'='*60}")
         print(f"Starting video processing pipeline for: {self.video_path}")
@@ -430,20 +1189,70 @@ Respond in JSON format:
             if progress_callback:
                 progress_callback(5, 'Extracting video metadata...')
             print("Step 1: Extracting video metadata...")
-            video_info = self.get_video_info()
+            with self.trace.stage('metadata'):
+                video_info = self.get_video_info()
             results['video_info'] = video_info
+            self._media_seconds = video_info['duration']
+            self.stream_copy_ok = (video_info['video_codec'] in STREAM_COPY_CODECS and
+                                   video_info['audio_codec'] in STREAM_COPY_AUDIO_CODECS)
             if progress_callback:
                 progress_callback(10, 'Video metadata extracted')
             
+            # Optional: build a proxy so every later decode is cheap
+            if self._should_use_proxy(video_info, options):
+                if progress_callback:
+                    progress_callback(12, 'Creating proxy for faster processing...')
+                print("\nStep 1b: Creating proxy for heavy source...")
+                proxy_height = self._proxy_height(video_info, options)
+                
+                def proxy_progress(fraction):
+                    if progress_callback:
+                        progress_callback(12 + int(fraction * 3), f'Creating proxy... {fraction:.0%}')
+                
+                with self.trace.stage('proxy'):
+                    proxy_path = self.create_proxy(proxy_height, progress_callback=proxy_progress)
+                if proxy_path:
+                    self.media_path = proxy_path
+                    # The proxy is a fast-decode mezzanine, not a delivery encode
+                    self.stream_copy_ok = False
+                    results['proxy_path'] = proxy_path
+            
             # Step 2: Generate subtitles (10-40%)
+            self._check_cancelled()
             if not skip_subtitles:
                 if progress_callback:
                     progress_callback(15, 'Generating subtitles with Whisper...')
                 print("\nStep 2: Generating subtitles with Whisper...")
-                subtitle_path, transcript = self.generate_subtitles(language=subtitle_language)
+                
+                def transcription_progress(fraction, partial):
+                    if progress_callback:
+                        progress_callback(
+                            15 + int(fraction * 25),
+                            f"Transcribing... {partial['transcribedSeconds']}s done",
+                            partial_transcript=partial
+                        )
+                
+                with self.trace.stage('transcription'):
+                    subtitle_path, transcript = self.generate_subtitles(
+                        language=subtitle_language,
+                        word_timestamps=word_timestamps,
+                        progress_callback=transcription_progress,
+                        use_vad=VAD_ENABLED if options.get('vad') is None else options['vad'],
+                        model_size=options.get('whisper_model') or 'auto',
+                        queue_depth=options.get('queue_depth', 0),
+                        latency_budget=options.get('latency_budget'),
+                        backend=options.get('transcription_backend')
+                    )
+                if self.model_choice:
+                    results['transcription'] = self.model_choice
                 results['subtitle_path'] = subtitle_path
                 results['transcript'] = transcript
                 results['detected_language'] = transcript.get('detected_language', 'unknown')
+                if self.speech_map:
+                    results['speech'] = {
+                        'speech_seconds': self.speech_map['speech_seconds'],
+                        'total_seconds': self.speech_map['total_seconds']
+                    }
                 if progress_callback:
                     progress_callback(40, 'Subtitles generated successfully')
             else:
@@ -464,19 +1273,46 @@ Respond in JSON format:
                     progress_callback(40, 'Subtitle generation skipped')
             
             # Step 3: AI analysis (40-55%)
+            self._check_cancelled()
+            use_index = options.get('media_index')
+            if use_index is None:
+                use_index = MEDIA_INDEX_ENABLED
+            if use_index:
+                if progress_callback:
+                    progress_callback(42, 'Indexing keyframes and scene changes...')
+                print("\nStep 3a: Indexing keyframes and scene changes...")
+                with self.trace.stage('media_index'):
+                    self.build_media_index()
+            
             if progress_callback:
                 progress_callback(45, 'Analyzing video with AI...')
             print("\nStep 3: Analyzing video with AI...")
-            analysis = self.analyze_with_ai(transcript, options)
+            with self.trace.stage('analysis'):
+                analysis = self.analyze_with_ai(transcript, options)
+            # Only AI picks are free to move: divide parts must stay adjacent
+            # and range clips must stay inside the requested range
+            snap = analysis and analysis.get('clips') and options.get('clip_mode', 'ai') == 'ai'
+            if snap and options.get('snap_to_words', True):
+                self.snap_clips_to_transcript(analysis['clips'])
+            if snap and options.get('snap_to_keyframes', True):
+                self.snap_clips_to_keyframes(analysis['clips'])
+            if snap and (start_time is not None or end_time is not None):
+                for clip in analysis['clips']:
+                    if start_time is not None:
+                        clip['start_time'] = max(float(clip['start_time']), float(start_time))
+                    if end_time is not None:
+                        clip['end_time'] = min(float(clip['end_time']), float(end_time))
             results['analysis'] = analysis
             if progress_callback:
                 progress_callback(55, 'AI analysis completed')
             
             # Step 4: Generate thumbnail (55-60%)
+            self._check_cancelled()
             if progress_callback:
                 progress_callback(57, 'Generating thumbnail...')
             print("\nStep 4: Generating thumbnail...")
-            thumbnail = self.generate_thumbnail()
+            with self.trace.stage('thumbnail'):
+                thumbnail = self.generate_thumbnail()
             results['thumbnail_path'] = thumbnail
             if progress_callback:
                 progress_callback(60, 'Thumbnail generated')
@@ -494,6 +1330,7 @@ Respond in JSON format:
                 results['status'] = 'completed'
                 if progress_callback:
                     progress_callback(100, 'No clips to create')
+                results['timings'] = self.trace.summary()
                 return results
             
             # Limit to requested number of clips
@@ -505,11 +1342,12 @@ Respond in JSON format:
             
             print(f"Creating {max_clips} clips from {len(analysis['clips'])} analyzed segments...")
             
-            # Calculate progress increment per clip (60% to 100% = 40% total)
-            progress_per_clip = 35 / max_clips if max_clips > 0 else 0
+            # Calculate progress increment per clip (65% to 95% = 30% total)
+            progress_per_clip = 30 / max_clips if max_clips > 0 else 0
             current_progress = 65
             
             for i, clip_data in enumerate(analysis['clips'][:max_clips]):
+                self._check_cancelled()
                 clip_filename = f"{self.video_id}_clip_{i+1}.mp4"
                 clip_path = os.path.join(self.output_dir, clip_filename)
                 
@@ -522,12 +1360,20 @@ Respond in JSON format:
                 # Only add subtitles if they were successfully generated
                 has_subtitles = subtitle_path and os.path.exists(subtitle_path) and os.path.getsize(subtitle_path) > 10
                 
+                def clip_progress(fraction, base=current_progress, number=i + 1):
+                    if progress_callback:
+                        progress_callback(
+                            int(base + fraction * progress_per_clip),
+                            f'Creating clip {number}/{max_clips}... {fraction:.0%}'
+                        )
+                
                 success = self.create_clip(
                     clip_data['start_time'],
                     clip_data['end_time'],
                     clip_path,
                     add_subtitles=has_subtitles,
-                    subtitle_path=subtitle_path if has_subtitles else None
+                    subtitle_path=subtitle_path if has_subtitles else None,
+                    progress_callback=clip_progress
                 )
                 
                 if success:
@@ -545,6 +1391,19 @@ Respond in JSON format:
                 
                 current_progress += progress_per_clip
             
+            # Step 6: Per-clip posters and sprite sheets (95-100%)
+            self._check_cancelled()
+            if clips_created and options.get('clip_thumbnails', True):
+                if progress_callback:
+                    progress_callback(96, 'Generating clip thumbnails...')
+                print("\nStep 6: Generating clip thumbnails...")
+                with self.trace.stage('clip_thumbnails'):
+                    self.generate_clip_thumbnails(
+                        clips_created,
+                        mode=options.get('thumbnail_mode', 'fast'),
+                        sprite=options.get('sprite_sheet', False)
+                    )
+            
             results['clips'] = clips_created
             results['status'] = 'completed'
             
@@ -555,6 +1414,12 @@ Respond in JSON format:
             print(f"✅ Processing completed! Created {len(clips_created)} clips")
             print(f"{'='*60}\n")
             
+        except JobCancelled as e:
+            print(f"\n⏹️ Processing cancelled: {e}")
+            results['status'] = 'cancelled'
+            results['error'] = str(e)
+            if progress_callback:
+                progress_callback(0, 'Cancelled')
         except Exception as e:
             print(f"\n❌ Error during processing: {e}")
             results['status'] = 'failed'
@@ -562,6 +1427,7 @@ Respond in JSON format:
             if progress_callback:
                 progress_callback(0, f'Failed: {str(e)}')
         
+        results['timings'] = self.trace.summary()
         return results
 
 
@@ -577,6 +1443,7 @@ if __name__ == "__main__":
     
     if len(sys.argv) < 2:
         print("Usage: python video_processor.py <video_path>")
+        print("       (use batch.py for directories or manifests of videos)")
         sys.exit(1)
     
     video_path = sys.argv[1]